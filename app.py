@@ -1,4 +1,83 @@
+"""
+Entry point for running the API.
+
+    python app.py                       # one worker on 127.0.0.1:8000 (development)
+    WEB_CONCURRENCY=8 python app.py --host 0.0.0.0 --loop uvloop --http httptools
+
+Every option can also be set through the environment variable named in its
+help text. On SIGTERM uvicorn stops accepting connections and lets in-flight
+requests finish for up to --graceful-timeout seconds before exiting.
+"""
+import argparse
+import glob
+import os
 import uvicorn
 
+def _env(name: str, default):
+    value = os.environ.get(name)
+    return type(default)(value) if value is not None else default
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the voice agent API")
+    parser.add_argument("--host", default=_env("HOST", "127.0.0.1"), help="Bind address (HOST)")
+    parser.add_argument("--port", type=int, default=_env("PORT", 8000), help="Bind port (PORT)")
+    parser.add_argument(
+        "--workers", type=int, default=_env("WEB_CONCURRENCY", 1),
+        help="Worker processes, usually one per core (WEB_CONCURRENCY)",
+    )
+    parser.add_argument(
+        "--loop", choices=["auto", "asyncio", "uvloop"], default=_env("UVICORN_LOOP", "auto"),
+        help="Event loop; auto picks uvloop when installed (UVICORN_LOOP)",
+    )
+    parser.add_argument(
+        "--http", choices=["auto", "h11", "httptools"], default=_env("UVICORN_HTTP", "auto"),
+        help="HTTP parser; auto picks httptools when installed (UVICORN_HTTP)",
+    )
+    parser.add_argument(
+        "--keep-alive", type=int, default=_env("UVICORN_TIMEOUT_KEEP_ALIVE", 5),
+        help="Seconds to hold idle keep-alive connections open (UVICORN_TIMEOUT_KEEP_ALIVE)",
+    )
+    parser.add_argument(
+        "--backlog", type=int, default=_env("UVICORN_BACKLOG", 2048),
+        help="Max pending connections in the listen queue (UVICORN_BACKLOG)",
+    )
+    parser.add_argument(
+        "--graceful-timeout", type=int, default=_env("UVICORN_TIMEOUT_GRACEFUL_SHUTDOWN", 30),
+        help="Seconds to drain in-flight requests on shutdown (UVICORN_TIMEOUT_GRACEFUL_SHUTDOWN)",
+    )
+    parser.add_argument("--reload", action="store_true", help="Reload on code changes (development only)")
+    return parser.parse_args(argv)
+
+def _reset_metrics_dir() -> None:
+    # With several workers, prometheus_client writes per-process files here and
+    # /metrics aggregates them; stale files from a previous run must go. Only
+    # those files are removed, in case the variable names a shared directory.
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        os.makedirs(path, exist_ok=True)
+        for stale in glob.glob(os.path.join(path, "*.db")):
+            os.remove(stale)
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    _reset_metrics_dir()
+    uvicorn.run(
+        "app:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop=args.loop,
+        http=args.http,
+        timeout_keep_alive=args.keep_alive,
+        backlog=args.backlog,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        reload=args.reload,
+        # Request latency is exported through /metrics instead
+        access_log=False,
+        # Keep uvicorn's loggers on the queued JSON pipeline set up by the app
+        # (app/utils/log_config.py) instead of its own synchronous handlers
+        log_config=None,
+    )
+
 if __name__ == "__main__":
-    uvicorn.run("app:app", host="127.0.0.1", port=8000, reload=False)
+    main()
@@ -2,29 +2,66 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-import logging
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from app.utils.log_config import configure_logging
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s | %(levelname)-8s | %(name)s | %(message)s",
-    datefmt="%H:%M:%S"
-)
+# Flushed by an atexit hook, so records logged during shutdown still get written
+configure_logging()
 
+import logging
 from contextlib import asynccontextmanager
-from app.models import init_db
+from app.config.config import settings
+from app.models import init_db, engine, replica_engine, async_session
+from app.models.pool import pool_stats, prewarm
 from app.routers.core.auth.router import router as auth_router
 from app.routers.agents import router as agents_router
 from app.routers.api_keys import router as api_keys_router
 from app.routers.tools import router as tools_router
 from app.routers.history import router as history_router
 from app.routers.phone_numbers import router as phone_numbers_router
+from app.routers.events import router as events_router
+from app.services import agent_cache, principal_cache, inbound_routing, livekit_sip, sip_provisioning, change_feed
+from app.utils import metrics
+from app.utils.security import shutdown_hashing
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+logger = logging.getLogger(__name__)
+
+async def _prewarm():
+    # Runs in every worker before it accepts traffic
+    await prewarm(engine, settings.DB_PREWARM_CONNECTIONS)
+    if replica_engine is not None:
+        await prewarm(replica_engine, settings.DB_PREWARM_CONNECTIONS)
+
+    if settings.PREWARM_CACHES:
+        # Both fill lazily anyway, so a failure here must not stop the worker
+        try:
+            await livekit_sip.load_trunk_index()
+        except Exception as e:
+            logger.warning("Could not preload the SIP trunk index: %s", e)
+        try:
+            async with async_session() as session:
+                routes = await inbound_routing.load(session)
+            logger.info("Preloaded %d inbound routes", routes)
+        except Exception as e:
+            logger.warning("Could not preload inbound routes: %s", e)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    await livekit_sip.init_client()
+    # LISTEN first, so a change committed while caches are prewarmed still invalidates them
+    await change_feed.start_listener(settings.CHANGE_FEED_STARTUP_TIMEOUT_SECONDS)
+    await _prewarm()
+    sip_provisioning.start_worker()
+    metrics.start_stats_publisher(settings.METRICS_STATS_INTERVAL_SECONDS)
     yield
+    await metrics.stop_stats_publisher()
+    await change_feed.stop_listener()
+    await sip_provisioning.stop_worker()
+    await livekit_sip.close_client()
+    shutdown_hashing()
 
 app = FastAPI(
     title="Voice AI Agent Backend",
@@ -40,13 +77,38 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
+
+def _database_pools():
+    pools = {"primary": pool_stats(engine)}
+    if replica_engine is not None:
+        pools["replica"] = pool_stats(replica_engine)
+    return pools
 
-app.include_router(auth_router, prefix="/auth", tags=["auth"])
+def _caches():
+    return {
+        "agents": agent_cache.stats(),
+        "principals": principal_cache.stats(),
+        "inbound_routes": inbound_routing.stats(),
+    }
+
+metrics.instrument_engine(engine, "primary")
+if replica_engine is not None:
+    metrics.instrument_engine(replica_engine, "replica")
+metrics.register_stats(
+    "db_pool", _database_pools, "engine",
+    counters=("checkouts", "checkout_timeouts", "wait_seconds_total"),
+)
+metrics.register_stats("cache", _caches, "cache", counters=("hits", "misses", "evictions"))
+metrics.register_stats("change_feed", lambda: {"sse": change_feed.stats()}, "feed", counters=("resyncs",))
+
+app.include_router(auth_router)
 app.include_router(agents_router)
 app.include_router(api_keys_router)
 app.include_router(tools_router)
 app.include_router(history_router)
 app.include_router(phone_numbers_router)
+app.include_router(events_router)
 
 @app.get("/")
 def read_root():
@@ -55,3 +117,18 @@ def read_root():
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
+
+@app.get("/health/pool")
+def database_pool_stats():
+    return _database_pools()
+
+@app.get("/health/cache")
+def cache_stats():
+    return {**_caches(), "change_feed": change_feed.stats()}
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    if metrics.multiprocess_mode():
+        # Several workers: aggregate what every process wrote to disk
+        return Response(generate_latest(metrics.multiprocess_registry()), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,3 +1,4 @@
+from typing import Dict, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -6,7 +7,92 @@ class Settings(BaseSettings):
     LIVEKIT_API_SECRET: str
     LIVEKIT_URL: str
     API_SECRET_KEY: str
+
+    # Database connection pool
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 100
+
+    # Optional read replica for read-only endpoints
+    DATABASE_REPLICA_URL: Optional[str] = None
+    # How long a client's reads stay on the primary after it commits a write
+    DATABASE_REPLICA_STICKY_SECONDS: float = 5.0
+
+    # Connections each worker opens at startup, before it accepts traffic
+    DB_PREWARM_CONNECTIONS: int = 2
+    # Load the SIP trunk index and inbound routes at startup
+    PREWARM_CACHES: bool = True
+
+    # Run migrations at startup instead of only checking the schema version (development)
+    DB_AUTO_MIGRATE: bool = False
+
+    # In-process cache of agent configs served to voice workers
+    AGENT_CACHE_MAX_SIZE: int = 1024
+    AGENT_CACHE_TTL_SECONDS: float = 60.0
+
+    # In-process map of dialed number -> agent used for inbound SIP dispatch
+    INBOUND_ROUTING_CACHE_MAX_SIZE: int = 10000
+    INBOUND_ROUTING_CACHE_TTL_SECONDS: float = 60.0
+
+    # Password hashing: bcrypt cost (raising it rehashes on the next signin) and
+    # the threads hashing runs on
+    PASSWORD_BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4
+
+    # Trust the user claims embedded in access tokens instead of looking the user up
+    AUTH_STATELESS_JWT: bool = False
+    AUTH_PRINCIPAL_CACHE_MAX_SIZE: int = 4096
+    AUTH_PRINCIPAL_CACHE_TTL_SECONDS: float = 30.0
+
+    # Shared LiveKit API client (SIP provisioning)
+    LIVEKIT_HTTP_TIMEOUT_SECONDS: float = 10.0
+    LIVEKIT_HTTP_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    LIVEKIT_HTTP_POOL_SIZE: int = 20
+    LIVEKIT_HTTP_KEEPALIVE_SECONDS: float = 30.0
+    LIVEKIT_SIP_LIST_PAGE_SIZE: int = 100
+
+    # Agent/tool/phone number change feed (Postgres LISTEN/NOTIFY -> SSE)
+    CHANGE_FEED_CHANNEL: str = "voice_agent_changes"
+    CHANGE_FEED_QUEUE_SIZE: int = 100
+    CHANGE_FEED_HEARTBEAT_SECONDS: float = 15.0
+    CHANGE_FEED_RECONNECT_SECONDS: float = 1.0
+    CHANGE_FEED_MAX_RECONNECT_SECONDS: float = 30.0
+    # How long startup waits for LISTEN before prewarming caches anyway
+    CHANGE_FEED_STARTUP_TIMEOUT_SECONDS: float = 5.0
+
+    # Call tokens: every call gets its own room named {prefix}-{session_id}
+    LIVEKIT_ROOM_PREFIX: str = "call"
+    LIVEKIT_TOKEN_BATCH_MAX: int = 100
+
+    # Background SIP trunk provisioning queue
+    SIP_PROVISIONING_MAX_ATTEMPTS: int = 8
+    SIP_PROVISIONING_BACKOFF_SECONDS: float = 2.0
+    SIP_PROVISIONING_MAX_BACKOFF_SECONDS: float = 300.0
+    SIP_PROVISIONING_POLL_SECONDS: float = 5.0
+    SIP_PROVISIONING_JOB_TIMEOUT_SECONDS: float = 120.0
+
+    # Max records accepted by POST /history/bulk
+    HISTORY_BULK_MAX_RECORDS: int = 1000
+    # Rows fetched per round trip when streaming GET /history/export
+    HISTORY_EXPORT_BATCH_SIZE: int = 500
+    # Postgres text search configuration used for GET /history/search
+    HISTORY_SEARCH_LANGUAGE: str = "english"
     
+    # Logging: root level, per-logger levels and sampling rates (JSON objects in env),
+    # e.g. LOG_LEVELS='{"sqlalchemy.engine": "WARNING"}' LOG_SAMPLING='{"app.routers": 0.1}'
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"
+    LOG_LEVELS: Dict[str, str] = {}
+    LOG_SAMPLING: Dict[str, float] = {}
+    LOG_QUEUE_SIZE: int = 10000
+
+    # With PROMETHEUS_MULTIPROC_DIR set, how often each worker writes its pool
+    # and cache stats for /metrics to aggregate
+    METRICS_STATS_INTERVAL_SECONDS: float = 5.0
+
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
 settings = Settings()
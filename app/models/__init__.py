@@ -1,24 +1,91 @@
-from sqlmodel import SQLModel
 from app.models.table.agent import Agent
 from app.models.table.api_key import ApiKey
 from app.models.table.tool import Tool
+from app.models.table.sip_provisioning_job import SipProvisioningJob
+from app.models.table.history import History
+from app.models.table.history_transcript import HistoryTranscript
+from app.models.table.agent_daily_stats import AgentDailyStats
+from app.models.table.phone_number import PhoneNumber
+from app.models.table.schema_version import SchemaVersion
 
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker
+import jwt
+from typing import Optional
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
 from app.config.config import settings
 from app.models.table.user import User
+from app.models.pool import create_engine
+from app.models.schema import check_schema, migrate
+from app.utils.cache import TTLCache
+from app.utils.security import ALGORITHM, SECRET_KEY
 
-engine = create_async_engine(settings.DATABASE_URL, future=True)
+engine = create_engine(settings.DATABASE_URL)
+# Created once; every request and background task gets its sessions from here
+async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+# Optional read replica for read-only endpoints; falls back to the primary
+replica_engine = create_engine(settings.DATABASE_REPLICA_URL) if settings.DATABASE_REPLICA_URL else None
+async_read_session = (
+    async_sessionmaker(replica_engine, class_=AsyncSession, expire_on_commit=False)
+    if replica_engine is not None
+    else async_session
+)
+
+# Signed-in users (by email) that committed a write recently. Their reads stay
+# on the primary for a few seconds so they see their own writes despite
+# replica lag.
+_recent_writers = TTLCache(max_size=10000, ttl_seconds=settings.DATABASE_REPLICA_STICKY_SECONDS)
+
+def _writer_key(request: Request) -> Optional[str]:
+    # The shared API key is never pinned: every voice worker uses it, so one
+    # worker's write would send all worker reads to the primary. Workers send
+    # X-Read-Your-Writes when they need to read their own writes.
+    scheme, _, token = (request.headers.get("authorization") or "").partition(" ")
+    if scheme.lower() != "bearer" or not token or token == settings.API_SECRET_KEY:
+        return None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.PyJWTError:
+        return None
+    return payload.get("sub")
+
+@event.listens_for(Session, "after_commit")
+def _mark_committed(session):
+    session.info["committed"] = True
 
 async def init_db():
-    async with engine.begin() as conn:
-        # await conn.run_sync(SQLModel.metadata.drop_all)
-        await conn.run_sync(SQLModel.metadata.create_all)
-
-async def get_session() -> AsyncSession:
-    async_session = sessionmaker(
-        engine, class_=AsyncSession, expire_on_commit=False
-    )
+    # DDL only runs through `python -m app.models.migrate`; booting a worker is a
+    # single version check unless DB_AUTO_MIGRATE is set (local development).
+    if settings.DB_AUTO_MIGRATE:
+        await migrate(engine)
+    else:
+        await check_schema(engine)
+
+async def get_session(request: Request) -> AsyncSession:
     async with async_session() as session:
         yield session
+        if session.info.get("committed") and async_read_session is not async_session:
+            writer = _writer_key(request)
+            if writer:
+                _recent_writers.set(writer, True)
+
+def reads_from_primary(request: Request) -> bool:
+    """Whether reads for this request must see the latest writes."""
+    if request.headers.get("x-read-your-writes", "").lower() in ("1", "true"):
+        return True
+    if async_read_session is async_session:
+        return True
+    writer = _writer_key(request)
+    return bool(writer) and _recent_writers.get(writer) is not None
+
+def read_session_factory(request: Request) -> async_sessionmaker:
+    """Sessionmaker for this request's reads: the replica unless the client needs its own writes."""
+    return async_session if reads_from_primary(request) else async_read_session
+
+async def get_read_session(request: Request) -> AsyncSession:
+    """Session for read-only handlers: the replica unless the client needs its own writes."""
+    async with read_session_factory(request)() as session:
+        yield session
 
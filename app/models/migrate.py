@@ -0,0 +1,12 @@
+import asyncio
+from app.models import engine
+from app.models.schema import migrate
+
+async def main():
+    try:
+        await migrate(engine)
+    finally:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
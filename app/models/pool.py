@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import time
+from typing import Dict
+from sqlalchemy import exc, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.config.config import settings
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that records how long callers wait to check a connection out.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.checkout_timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+# SQLAlchemy names a pool's logger after its class, so this one falls outside
+# the "sqlalchemy" hierarchy SQLAlchemy defaults to WARN, and would log pool
+# resets and invalidations (e.g. on every cancelled request) at INFO. Keep the
+# SQLAlchemy default unless LOG_LEVELS configured it.
+_pool_logger = logging.getLogger(f"{TimedQueuePool.__module__}.{TimedQueuePool.__name__}")
+if _pool_logger.level == logging.NOTSET:
+    _pool_logger.setLevel(logging.WARNING)
+
+def create_engine(url: str) -> AsyncEngine:
+    """
+    Creates an async engine with the pool settings from Settings.
+
+    Args:
+        url: The database URL.
+    """
+    url = make_url(url)
+    connect_args = {}
+    if url.get_driver_name() == "asyncpg":
+        # asyncpg's own statement cache plus SQLAlchemy's prepared statement cache;
+        # set DB_STATEMENT_CACHE_SIZE=0 behind pgbouncer in transaction mode.
+        connect_args["statement_cache_size"] = settings.DB_STATEMENT_CACHE_SIZE
+        url = url.update_query_dict({"prepared_statement_cache_size": str(settings.DB_STATEMENT_CACHE_SIZE)})
+
+    return create_async_engine(
+        url,
+        future=True,
+        poolclass=TimedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+
+async def prewarm(engine: AsyncEngine, connections: int) -> None:
+    """
+    Opens pool connections up front so the first requests don't pay for connecting.
+
+    Args:
+        engine: The engine whose pool to fill.
+        connections: How many connections to open, capped at the pool size.
+    """
+    async def _open():
+        connection = await engine.connect()
+        await connection.execute(text("SELECT 1"))
+        return connection
+
+    # Held concurrently, otherwise the pool would hand out the same one each time
+    results = await asyncio.gather(
+        *(_open() for _ in range(min(connections, settings.DB_POOL_SIZE))),
+        return_exceptions=True,
+    )
+    for result in results:
+        if not isinstance(result, BaseException):
+            await result.close()
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+def pool_stats(engine: AsyncEngine) -> Dict[str, float]:
+    """Returns pool occupancy and checkout wait figures for an engine."""
+    pool = engine.pool
+    stats = {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+    }
+    # Saturated: every connection, overflow included, is in use
+    stats["saturation"] = stats["checked_out"] / (stats["size"] + stats["max_overflow"])
+    if isinstance(pool, TimedQueuePool):
+        stats.update(
+            checkouts=pool.checkouts,
+            checkout_timeouts=pool.checkout_timeouts,
+            wait_seconds_total=pool.wait_seconds_total,
+            wait_seconds_max=pool.wait_seconds_max,
+        )
+    return stats
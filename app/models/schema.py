@@ -0,0 +1,156 @@
+import hashlib
+import logging
+from datetime import datetime
+from sqlmodel import SQLModel, select
+from sqlalchemy import exc, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+from app.config.config import settings
+from app.models.table.schema_version import SchemaVersion
+
+logger = logging.getLogger(__name__)
+
+# create_all only creates missing tables, so columns and indexes added to
+# existing tables are applied by these statements, in order, after it. Every
+# statement must be idempotent; append new ones at the end.
+#
+# Deploys run migrate first and then roll workers over, so the previous build
+# keeps serving on the upgraded schema for a while. Statements must therefore
+# be additive: anything the previous build still reads (a column, a table) is
+# only dropped in a release after the one that stopped using it.
+SCHEMA_UPGRADES = [
+    'ALTER TABLE "voice-agent-history" ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR',
+    # Idempotency keys are scoped to their user
+    'CREATE UNIQUE INDEX IF NOT EXISTS ux_history_user_idempotency_key '
+    'ON "voice-agent-history" (user_id, idempotency_key)',
+    'CREATE INDEX IF NOT EXISTS ix_history_user_agent_date_time '
+    'ON "voice-agent-history" (user_id, agent_id, date, time)',
+    # Copy inline transcripts into their own table. The old column stays (unused
+    # by this build) so workers of the previous build keep running during the
+    # deploy; rerunning migrate afterwards copies what they wrote meanwhile. It
+    # is dropped by a later release.
+    """
+    DO $$
+    BEGIN
+        IF EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'voice-agent-history' AND column_name = 'conversation'
+        ) THEN
+            INSERT INTO "voice-agent-history-transcript" (history_id, conversation)
+            SELECT id, COALESCE(conversation::jsonb, '[]'::jsonb) FROM "voice-agent-history"
+            ON CONFLICT (history_id) DO NOTHING;
+        END IF;
+    END $$
+    """,
+    # Full-text search over summaries and transcripts (see services/transcript_search.py)
+    'ALTER TABLE "voice-agent-history-transcript" ADD COLUMN IF NOT EXISTS search_vector tsvector',
+    'CREATE INDEX IF NOT EXISTS ix_history_transcript_search '
+    'ON "voice-agent-history-transcript" USING gin (search_vector)',
+    """
+    UPDATE "voice-agent-history-transcript" AS t
+    SET search_vector =
+        to_tsvector(CAST(:search_language AS regconfig), coalesce(h.summary, ''))
+        || jsonb_to_tsvector(
+            CAST(:search_language AS regconfig),
+            jsonb_path_query_array(t.conversation, '$[*].content'),
+            '["string"]'
+        )
+    FROM "voice-agent-history" AS h
+    WHERE h.id = t.history_id AND t.search_vector IS NULL
+    """,
+    # Seed the daily rollups from existing history, only while they are still empty
+    """
+    INSERT INTO "voice-agent-daily-stats" (agent_id, day, user_id, call_count, total_duration)
+    SELECT agent_id, date, min(user_id), count(*), coalesce(sum(duration), 0)
+    FROM "voice-agent-history"
+    WHERE NOT EXISTS (SELECT 1 FROM "voice-agent-daily-stats")
+    GROUP BY agent_id, date
+    """,
+    # Version counters behind the ETags of agent, tool and phone number reads
+    'ALTER TABLE "voice-agent-agent" ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1',
+    'ALTER TABLE "voice-agent-tool" ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1',
+    'ALTER TABLE phone_number ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1',
+    # Inbound call routing: dialed number -> phone number -> agent
+    'CREATE INDEX IF NOT EXISTS ix_phone_number_number ON phone_number (number)',
+    'CREATE INDEX IF NOT EXISTS "ix_voice-agent-agent_inbound_id" ON "voice-agent-agent" (inbound_id)',
+]
+
+SCHEMA_VERSION = len(SCHEMA_UPGRADES)
+
+def _upgrade_params(statement: str) -> dict:
+    # Settings are bound at migrate time rather than written into the SQL, so
+    # they stay out of the fingerprint and can change without a migration
+    params = {"search_language": settings.HISTORY_SEARCH_LANGUAGE}
+    return {name: value for name, value in params.items() if f":{name}" in statement}
+
+MIGRATE_COMMAND = "python -m app.models.migrate"
+
+class SchemaMismatchError(RuntimeError):
+    """Raised at startup when the database schema does not match this build."""
+
+def schema_fingerprint() -> str:
+    """
+    Hash of the tables, columns and indexes this code expects, plus the upgrade statements.
+    """
+    digest = hashlib.sha256()
+    for table in sorted(SQLModel.metadata.tables.values(), key=lambda t: t.name):
+        digest.update(table.name.encode())
+        for column in table.columns:
+            digest.update(f"{column.name}:{type(column.type).__name__}:{column.nullable}:{column.primary_key}".encode())
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            digest.update(f"{index.name}:{index.unique}".encode())
+    for statement in SCHEMA_UPGRADES:
+        digest.update(statement.encode())
+    return digest.hexdigest()
+
+async def check_schema(engine: AsyncEngine) -> None:
+    """
+    Verifies with a single query that the database has been migrated for this build.
+
+    Raises:
+        SchemaMismatchError: If the schema is missing or older than this build.
+    """
+    statement = select(SchemaVersion.version, SchemaVersion.fingerprint).where(SchemaVersion.id == 1)
+    try:
+        async with engine.connect() as conn:
+            result = await conn.execute(statement)
+            row = result.first()
+    except exc.ProgrammingError:
+        # The version table itself doesn't exist yet
+        row = None
+
+    if row is None:
+        raise SchemaMismatchError(f"Database schema is not initialised; run `{MIGRATE_COMMAND}`")
+
+    if row.version < SCHEMA_VERSION:
+        raise SchemaMismatchError(
+            f"Database schema version {row.version} is older than this build ({SCHEMA_VERSION}); "
+            f"run `{MIGRATE_COMMAND}`"
+        )
+
+    # Upgrades are additive (see SCHEMA_UPGRADES), so an older build keeps
+    # working during a rolling deploy, even when the newer one changed the
+    # models without a new version
+    if row.version > SCHEMA_VERSION:
+        logger.warning("Database schema version %d is newer than this build (%d)", row.version, SCHEMA_VERSION)
+    elif row.fingerprint != schema_fingerprint():
+        logger.warning(
+            "Database schema version %d was migrated from different models than this build; "
+            "run `%s` if this build is the newer one",
+            row.version, MIGRATE_COMMAND,
+        )
+
+async def migrate(engine: AsyncEngine) -> None:
+    """
+    Creates missing tables, applies every upgrade statement and records the version.
+    """
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+        for statement in SCHEMA_UPGRADES:
+            await conn.execute(text(statement), _upgrade_params(statement))
+
+        values = {"version": SCHEMA_VERSION, "fingerprint": schema_fingerprint(), "applied_at": datetime.utcnow()}
+        upsert = pg_insert(SchemaVersion).values(id=1, **values)
+        await conn.execute(upsert.on_conflict_do_update(index_elements=["id"], set_=values))
+
+    logger.info("Database schema migrated to version %d", SCHEMA_VERSION)
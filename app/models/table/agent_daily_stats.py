@@ -0,0 +1,12 @@
+from sqlmodel import SQLModel, Field
+from datetime import date
+
+class AgentDailyStats(SQLModel, table=True):
+    __tablename__ = "voice-agent-daily-stats"
+
+    # One row per agent per day, updated as history rows are inserted
+    agent_id: str = Field(foreign_key="voice-agent-agent.id", primary_key=True)
+    day: date = Field(primary_key=True)
+    user_id: int = Field(foreign_key="voice-agent-user.id", index=True)
+    call_count: int = Field(default=0)
+    total_duration: int = Field(default=0)
@@ -1,10 +1,16 @@
 from sqlmodel import SQLModel, Field
-from typing import Optional, List, Dict
+from typing import Optional
 from datetime import date, time
-from sqlalchemy import Column, JSON
+from sqlalchemy import Index
 
 class History(SQLModel, table=True):
     __tablename__ = "voice-agent-history"
+    __table_args__ = (
+        # Serves per-agent listings ordered by (date, time) and keyset pagination
+        Index("ix_history_user_agent_date_time", "user_id", "agent_id", "date", "time"),
+        # Idempotency keys are only unique per user, so tenants can't see each other's records
+        Index("ux_history_user_idempotency_key", "user_id", "idempotency_key", unique=True),
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="voice-agent-user.id")
@@ -13,4 +19,6 @@ class History(SQLModel, table=True):
     time: time
     duration: int
     summary: Optional[str] = Field(default=None)
-    conversation: List[dict] = Field(default=[], sa_column=Column(JSON))
+    # The transcript lives in HistoryTranscript
+    # Client supplied key so worker retries don't record the same call twice
+    idempotency_key: Optional[str] = Field(default=None)
@@ -0,0 +1,16 @@
+from sqlmodel import SQLModel, Field
+from typing import List, Optional
+from sqlalchemy import Column, Index
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+
+class HistoryTranscript(SQLModel, table=True):
+    __tablename__ = "voice-agent-history-transcript"
+    __table_args__ = (
+        Index("ix_history_transcript_search", "search_vector", postgresql_using="gin"),
+    )
+
+    # Kept apart from History so listing and filtering calls only touches small rows
+    history_id: int = Field(foreign_key="voice-agent-history.id", primary_key=True)
+    conversation: List[dict] = Field(default=[], sa_column=Column(JSONB, nullable=False))
+    # Summary + transcript text, maintained on insert (see services/transcript_search.py)
+    search_vector: Optional[str] = Field(default=None, sa_column=Column(TSVECTOR))
@@ -8,7 +8,9 @@ class PhoneNumber(SQLModel, table=True):
     
     id: Optional[UUID] = Field(default_factory=uuid4, primary_key=True)
     label: str
-    number: str
+    number: str = Field(index=True)
     provider: str
     user_id: int = Field(foreign_key="voice-agent-user.id")
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    # Bumped on every update; used for ETags
+    version: int = Field(default=1)
@@ -0,0 +1,11 @@
+from sqlmodel import SQLModel, Field
+from datetime import datetime
+
+class SchemaVersion(SQLModel, table=True):
+    __tablename__ = "voice-agent-schema-version"
+
+    # Single row, written by `python -m app.models.migrate`
+    id: int = Field(default=1, primary_key=True)
+    version: int
+    fingerprint: str
+    applied_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,23 @@
+from sqlmodel import SQLModel, Field
+from typing import Optional
+from datetime import datetime
+
+class SipProvisioningJob(SQLModel, table=True):
+    __tablename__ = "voice-agent-sip-job"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    agent_id: str = Field(foreign_key="voice-agent-agent.id", index=True)
+
+    # "create" or "delete"
+    action: str
+    number: str
+    trunk_name: Optional[str] = Field(default=None)
+
+    # pending -> running -> succeeded | failed (retried as pending until max attempts)
+    status: str = Field(default="pending", index=True)
+    attempts: int = Field(default=0)
+    last_error: Optional[str] = Field(default=None)
+    run_after: datetime = Field(default_factory=datetime.utcnow)
+
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
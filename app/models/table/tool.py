@@ -9,3 +9,5 @@ class Tool(SQLModel, table=True):
     name: str
     appointment_tool: bool = Field(default=False)
     user_id: int = Field(foreign_key="voice-agent-user.id")
+    # Bumped on every update; used for ETags
+    version: int = Field(default=1)
@@ -1,23 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, Header, Security
+from fastapi import APIRouter, Depends, HTTPException, Header, Security, Request, Response
 import logging
 
-# Configure logger
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
 from sqlmodel import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from ..models.table.agent import Agent
 from ..models.table.user import User
-from ..models import get_session
+from ..models import get_session, get_read_session
 from ..routers.core.auth.router import get_current_user, verify_api_key_or_user
 from livekit.api import AccessToken, VideoGrants
+from livekit.protocol.room import RoomConfiguration
 from ..config.config import settings
 from pydantic import BaseModel
 from typing import Optional
-from uuid import UUID
-from ..services import livekit_sip
+from uuid import UUID, uuid4
+import json
+from ..services import sip_provisioning
+from ..services import agent_cache
+from ..services import inbound_routing
+from ..services import change_feed
+from ..utils.etag import make_etag, is_not_modified, not_modified
+from ..utils.fast_json import model_columns, rows_response
 from ..models.table.phone_number import PhoneNumber
+from ..models.table.tool import Tool
+from ..models.table.sip_provisioning_job import SipProvisioningJob
 
 router = APIRouter(
     prefix="/agents",
@@ -75,20 +82,25 @@ async def update_agent(
     if not agent:
         raise HTTPException(status_code=404, detail="Agent not found")
     
-    # Check if inbound_id is being updated
+    # Numbers whose inbound route changes with this update
+    rerouted_numbers = []
+
     # Check if inbound_id is being updated
     if agent_update.inbound_id != agent.inbound_id:
-        
-        # CASE 1: Removing the inbound number (new is None, old was not None)
-        if agent_update.inbound_id is None and agent.inbound_id is not None:
-             # Fetch the old phone number details to delete the trunk
+        old_phone_number_record = None
+        if agent.inbound_id is not None:
+            # Fetch the old phone number details (trunk deletion, route refresh)
             old_phone_statement = select(PhoneNumber).where(PhoneNumber.id == agent.inbound_id)
             old_phone_result = await session.execute(old_phone_statement)
             old_phone_number_record = old_phone_result.scalars().first()
-            
             if old_phone_number_record:
-                logger.info(f"Agent {agent_id} removing inbound number {old_phone_number_record.number}. Deleting SIP trunk...")
-                await livekit_sip.delete_sip_inbound_trunk_by_number(old_phone_number_record.number)
+                rerouted_numbers.append(old_phone_number_record.number)
+        
+        # CASE 1: Removing the inbound number (new is None, old was not None)
+        if agent_update.inbound_id is None and agent.inbound_id is not None:
+            if old_phone_number_record:
+                logger.info("Agent %s removing inbound number %s. Queueing SIP trunk deletion...", agent_id, old_phone_number_record.number)
+                sip_provisioning.enqueue_delete(session, agent.id, old_phone_number_record.number)
 
         # CASE 2: Adding or Changing the inbound number
         elif agent_update.inbound_id is not None:
@@ -96,85 +108,215 @@ async def update_agent(
             phone_statement = select(PhoneNumber).where(PhoneNumber.id == agent_update.inbound_id)
             phone_result = await session.execute(phone_statement)
             phone_number_record = phone_result.scalars().first()
-            logger.info(f"Phone number record: {phone_number_record}")
+            logger.debug("Phone number record: %s", phone_number_record)
             
             if phone_number_record:
-                # Create SIP trunk asynchronously (fire and forget, or await if critical)
-                # Awaiting here to ensure it works before confirming update, 
-                # though in prod you might want to background task this.
-                await livekit_sip.create_sip_inbound_trunk(agent.name, phone_number_record.number)
+                rerouted_numbers.append(phone_number_record.number)
+                # The trunk is created by the provisioning worker once this update commits;
+                # clients poll /agents/provisioning/{agent_id} for the outcome.
+                sip_provisioning.enqueue_create(session, agent.id, agent.name, phone_number_record.number)
 
 
     
-    # Debug logging
-    update_data_log = agent_update.model_dump(exclude_unset=True)
-    if 'system_prompt' in update_data_log and update_data_log['system_prompt']:
-        update_data_log['system_prompt'] = update_data_log['system_prompt'][:50] + "..."
-    if 'greeting_prompt' in update_data_log and update_data_log['greeting_prompt']:
-        update_data_log['greeting_prompt'] = update_data_log['greeting_prompt'][:50] + "..."
-        
-    logger.info(f"Updating agent {agent_id}. Received: {update_data_log}")
-    
     # Update fields if provided in matching schema
     update_data = agent_update.model_dump(exclude_unset=True)
+
+    # Debug logging (payload only built when debug is enabled for this logger)
+    if logger.isEnabledFor(logging.DEBUG):
+        update_data_log = dict(update_data)
+        if update_data_log.get('system_prompt'):
+            update_data_log['system_prompt'] = update_data_log['system_prompt'][:50] + "..."
+        if update_data_log.get('greeting_prompt'):
+            update_data_log['greeting_prompt'] = update_data_log['greeting_prompt'][:50] + "..."
+        logger.debug("Updating agent %s. Received: %s", agent_id, update_data_log)
+    else:
+        logger.info("Updating agent %s", agent_id)
     for key, value in update_data.items():
         if hasattr(agent, key):
             setattr(agent, key, value)
+    # Incremented in SQL so concurrent updates never share a version
+    agent.version = Agent.version + 1
+    await change_feed.publish(session, "agent", "updated", agent.id, agent.user_id, numbers=rerouted_numbers)
     
     await session.commit()
     await session.refresh(agent)
-    await session.refresh(agent)
+    agent_cache.invalidate(agent_id)
+    for number in rerouted_numbers:
+        inbound_routing.invalidate(number)
+    sip_provisioning.notify()
     return agent
 
 
 @router.get("/get/{agent_id}", response_model=Agent)
 async def get_agent(
     agent_id: str, 
-    session: AsyncSession = Depends(get_session), 
+    request: Request,
+    response: Response,
     auth_info: dict = Depends(verify_api_key_or_user)
 ):
-    if auth_info["type"] == "api_key":
-        # API Key access: Fetch agent by ID only
-        statement = select(Agent).where(Agent.id == agent_id)
-    else:
-        # User access: Fetch agent by ID and User ID
-        current_user = auth_info["user"]
-        statement = select(Agent).where(
-            Agent.id == agent_id,
-            Agent.user_id == current_user.id
-        )
+    agent = await agent_cache.get_agent(agent_id)
     
-    result = await session.execute(statement)
-    agent = result.scalars().first()
-    
-    if agent:
+    # API Key access: any agent by ID. User access: only agents owned by the user
+    if agent and (auth_info["type"] == "api_key" or agent.user_id == auth_info["user"].id):
+        etag = make_etag("agent", agent.id, agent.version)
+        if is_not_modified(request, etag):
+            return not_modified(etag)
+        response.headers["ETag"] = etag
         return agent
 
     raise HTTPException(status_code=404, detail="Agent not found")
 
 @router.get("/get", response_model=List[Agent])
-async def read_agents(session: AsyncSession = Depends(get_session), current_user: User = Depends(get_current_user)):
-    statement = select(Agent).where(Agent.user_id == current_user.id)
+async def read_agents(
+    request: Request,
+    session: AsyncSession = Depends(get_read_session),
+    current_user: User = Depends(get_current_user)
+):
+    # Versions only first: an unchanged list is answered without loading the rows
+    version_statement = select(Agent.id, Agent.version).where(Agent.user_id == current_user.id).order_by(Agent.id)
+    version_result = await session.execute(version_statement)
+    etag = make_etag("agents", current_user.id, *(f"{id}:{version}" for id, version in version_result.all()))
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+
+    statement = select(*model_columns(Agent, Agent)).where(Agent.user_id == current_user.id)
     result = await session.execute(statement)
-    agents = result.scalars().all()
-    
-    return agents
+    return rows_response(result.mappings().all(), headers={"ETag": etag})
+
+class ProvisioningStatus(BaseModel):
+    agent_id: str
+    status: str
+    jobs: List[SipProvisioningJob]
+
+@router.get("/provisioning/{agent_id}", response_model=ProvisioningStatus)
+async def get_provisioning_status(
+    agent_id: str,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    statement = select(Agent.id).where(Agent.id == agent_id, Agent.user_id == current_user.id)
+    result = await session.execute(statement)
+    if not result.first():
+        raise HTTPException(status_code=404, detail="Agent not found")
+
+    jobs = await sip_provisioning.get_jobs(session, agent_id)
+    # The latest job decides the agent's status; "idle" if nothing was ever queued
+    status = jobs[0].status if jobs else "idle"
+    return ProvisioningStatus(agent_id=agent_id, status=status, jobs=jobs)
+
+class AgentBootstrap(BaseModel):
+    agent: Agent
+    tool: Optional[Tool] = None
+    phone_number: Optional[PhoneNumber] = None
+
+@router.get("/bootstrap/{agent_id}", response_model=AgentBootstrap)
+async def bootstrap_agent(
+    agent_id: str,
+    session: AsyncSession = Depends(get_read_session),
+    auth_info: dict = Depends(verify_api_key_or_user)
+):
+    # Everything a worker needs to start a call, in one round trip and one query
+    statement = (
+        select(Agent, Tool, PhoneNumber)
+        .outerjoin(Tool, Agent.tool_id == Tool.id)
+        .outerjoin(PhoneNumber, Agent.inbound_id == PhoneNumber.id)
+        .where(Agent.id == agent_id)
+    )
+    if auth_info["type"] != "api_key":
+        statement = statement.where(Agent.user_id == auth_info["user"].id)
+
+    result = await session.execute(statement)
+    row = result.first()
+
+    if not row:
+        raise HTTPException(status_code=404, detail="Agent not found")
+
+    agent, tool, phone_number = row
+    return AgentBootstrap(agent=agent, tool=tool, phone_number=phone_number)
+
+class InboundRoute(BaseModel):
+    number: str
+    agent_id: str
+
+@router.get("/route/{number}", response_model=InboundRoute)
+async def route_inbound_call(
+    number: str,
+    session: AsyncSession = Depends(get_session),
+    auth_info: dict = Depends(verify_api_key_or_user)
+):
+    # Resolves the agent answering a dialed number; primary session so a
+    # route that just changed is never cached from a lagging replica
+    agent_id = await inbound_routing.resolve(session, number)
+
+    if agent_id and auth_info["type"] == "user":
+        agent = await agent_cache.get_agent(agent_id)
+        if not agent or agent.user_id != auth_info["user"].id:
+            agent_id = None
+
+    if not agent_id:
+        raise HTTPException(status_code=404, detail="No agent for this number")
+    return InboundRoute(number=number, agent_id=agent_id)
 
 class TokenResponse(BaseModel):
     token: str
     url: str
+    room: str
+    session_id: str
 
-@router.get("/token", response_model=TokenResponse)
-async def get_token(agent_id: str,current_user: User = Depends(get_current_user)):
-    grant = VideoGrants(room_join=True, room="voice-assistant-room", can_publish=True, can_subscribe=True)
+class TokenBatchRequest(BaseModel):
+    agent_id: str
+    count: int
+
+class TokenBatchResponse(BaseModel):
+    tokens: List[TokenResponse]
+
+def _mint_token(identity: Optional[str], agent_id: str) -> TokenResponse:
+    # One room per call session so concurrent calls never share a room
+    session_id = uuid4().hex
+    room = f"{settings.LIVEKIT_ROOM_PREFIX}-{session_id}"
+    attributes = {"agent_id": agent_id, "session_id": session_id}
+
+    grant = VideoGrants(room_join=True, room=room, can_publish=True, can_subscribe=True)
     access_token = (
         AccessToken(settings.LIVEKIT_API_KEY, settings.LIVEKIT_API_SECRET)
-        .with_identity(str(current_user.id))
+        .with_identity(identity or f"caller-{session_id}")
         .with_grants(grant)
-        .with_attributes({"agent_id": agent_id})
+        .with_attributes(attributes)
+        .with_metadata(json.dumps(attributes))
+        .with_room_config(RoomConfiguration(name=room, metadata=json.dumps(attributes)))
     )
-    
+
     return TokenResponse(
         token=access_token.to_jwt(),
-        url=settings.LIVEKIT_URL
+        url=settings.LIVEKIT_URL,
+        room=room,
+        session_id=session_id
     )
+
+@router.get("/token", response_model=TokenResponse)
+async def get_token(agent_id: str,current_user: User = Depends(get_current_user)):
+    # Workers dispatch on the room metadata, so it may only name the caller's own agent
+    agent = await agent_cache.get_agent(agent_id)
+    if not agent or agent.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    return _mint_token(str(current_user.id), agent.id)
+
+@router.post("/token/batch", response_model=TokenBatchResponse)
+async def get_token_batch(
+    batch: TokenBatchRequest,
+    auth_info: dict = Depends(verify_api_key_or_user)
+):
+    # Pre-minted tokens for dialers, each for its own call room
+    if not 1 <= batch.count <= settings.LIVEKIT_TOKEN_BATCH_MAX:
+        raise HTTPException(
+            status_code=400,
+            detail=f"count must be between 1 and {settings.LIVEKIT_TOKEN_BATCH_MAX}"
+        )
+
+    agent = await agent_cache.get_agent(batch.agent_id)
+    if not agent or (auth_info["type"] == "user" and agent.user_id != auth_info["user"].id):
+        raise HTTPException(status_code=404, detail="Agent not found")
+
+    # API key callers get an anonymous identity per session
+    identity = str(auth_info["user"].id) if auth_info["type"] == "user" else None
+    return TokenBatchResponse(tokens=[_mint_token(identity, agent.id) for _ in range(batch.count)])
@@ -4,8 +4,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from ..models.table.api_key import ApiKey
 from ..models.table.user import User
-from ..models import get_session
+from ..models import get_session, get_read_session
 from ..routers.core.auth.router import get_current_user
+from ..utils.fast_json import model_columns, rows_response
 from pydantic import BaseModel
 
 router = APIRouter(
@@ -40,14 +41,13 @@ async def create_api_key(api_key_in: ApiKeyCreate, session: AsyncSession = Depen
     return api_key
 
 @router.get("/list", response_model=List[ApiKey])
-async def list_api_keys(session: AsyncSession = Depends(get_session), current_user: User = Depends(get_current_user)):
-    statement = select(ApiKey).where(ApiKey.user_id == current_user.id)
+async def list_api_keys(session: AsyncSession = Depends(get_read_session), current_user: User = Depends(get_current_user)):
+    statement = select(*model_columns(ApiKey, ApiKey)).where(ApiKey.user_id == current_user.id)
     result = await session.execute(statement)
-    api_keys = result.scalars().all()
-    return api_keys
+    return rows_response(result.mappings().all())
 
 @router.get("/get/{name}", response_model=ApiKey)
-async def get_api_key(name: str, session: AsyncSession = Depends(get_session), current_user: User = Depends(get_current_user)):
+async def get_api_key(name: str, session: AsyncSession = Depends(get_read_session), current_user: User = Depends(get_current_user)):
     statement = select(ApiKey).where(ApiKey.name == name, ApiKey.user_id == current_user.id)
     result = await session.execute(statement)
     api_key = result.scalars().first()
@@ -6,13 +6,15 @@ from app.models.table.user import User
 from app.utils.security import get_password_hash, verify_password, create_access_token, create_refresh_token
 from typing import Optional
 from app.config.config import settings
+from app.services import principal_cache
 import logging
 
-# Configure logger
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
 
-router = APIRouter()
+router = APIRouter(
+    prefix="/auth",
+    tags=["auth"],
+)
 
 class UserCreate(BaseModel):
     name: str
@@ -28,6 +30,10 @@ class Token(BaseModel):
     refresh_token: str
     token_type: str
 
+def _access_claims(user: User) -> dict:
+    # Carry what endpoints need so requests can be authenticated without a lookup
+    return {"sub": user.email, "uid": user.id, "name": user.name}
+
 @router.post("/signup", response_model=Token)
 async def signup(user: UserCreate, session: Session = Depends(get_session)):
     # Check if user exists
@@ -42,14 +48,14 @@ async def signup(user: UserCreate, session: Session = Depends(get_session)):
         )
     
     # Create new user
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash(user.password)
     new_user = User(name=user.name, email=user.email, password=hashed_password)
     session.add(new_user)
     await session.commit()
     await session.refresh(new_user)
     
     # Generate tokens
-    access_token = create_access_token(data={"sub": new_user.email})
+    access_token = create_access_token(data=_access_claims(new_user))
     refresh_token, refresh_expires = create_refresh_token(data={"sub": new_user.email})
     
     # Store refresh token in database
@@ -65,21 +71,27 @@ async def signin(user: UserLogin, session: Session = Depends(get_session)):
     result = await session.execute(statement)
     db_user = result.scalars().first()
     
-    if not db_user or not verify_password(user.password, db_user.password):
+    verified, new_hash = await verify_password(user.password, db_user.password if db_user else None)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    # Stored with a deprecated scheme or outdated cost; saved with the tokens below
+    if new_hash:
+        db_user.password = new_hash
     
     # Generate tokens
-    access_token = create_access_token(data={"sub": db_user.email})
+    access_token = create_access_token(data=_access_claims(db_user))
     refresh_token, refresh_expires = create_refresh_token(data={"sub": db_user.email})
     
     # Store refresh token in database
     db_user.refresh_token = refresh_token
     db_user.refresh_token_expires = refresh_expires
     await session.commit()
+    principal_cache.invalidate(db_user.email)
     
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
@@ -89,6 +101,13 @@ import jwt
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/signin")
 
+async def _resolve_principal(payload: dict, session: Session) -> Optional[principal_cache.Principal]:
+    if settings.AUTH_STATELESS_JWT:
+        principal = principal_cache.from_claims(payload)
+        if principal is not None:
+            return principal
+    return await principal_cache.get_principal(session, payload["sub"])
+
 async def get_current_user(token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -103,9 +122,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme), session: Session
     except jwt.PyJWTError:
         raise credentials_exception
         
-    statement = select(User).where(User.email == email)
-    result = await session.execute(statement)
-    user = result.scalars().first()
+    user = await _resolve_principal(payload, session)
     if user is None:
         raise credentials_exception
     return user
@@ -160,13 +177,14 @@ async def refresh_token(token_request: RefreshTokenRequest, session: Session = D
         )
     
     # Generate new tokens
-    new_access_token = create_access_token(data={"sub": user.email})
+    new_access_token = create_access_token(data=_access_claims(user))
     new_refresh_token, refresh_expires = create_refresh_token(data={"sub": user.email})
     
     # Update stored refresh token
     user.refresh_token = new_refresh_token
     user.refresh_token_expires = refresh_expires
     await session.commit()
+    principal_cache.invalidate(user.email)
     
     return {"access_token": new_access_token, "refresh_token": new_refresh_token, "token_type": "bearer"}
 
@@ -174,45 +192,42 @@ async def verify_api_key_or_user(
     authorization: Optional[str] = Header(None),
     session: Session = Depends(get_session)
 ) -> dict:
-    # DEBUG LOGGING
-    logger.info("DEBUG: verify_api_key_or_user called")
+    logger.debug("verify_api_key_or_user called")
     
     if not authorization:
-        logger.info("DEBUG: No authorization header")
+        logger.debug("No authorization header")
         raise HTTPException(status_code=401, detail="Not authenticated")
 
     scheme, _, param = authorization.partition(" ")
-    logger.info(f"DEBUG: scheme: '{scheme}', param: '{param}'")
+    logger.debug("Authorization scheme: %r", scheme)
 
     # 1. Check for API Key
     if scheme.lower() == "bearer" and param == settings.API_SECRET_KEY:
-        logger.info("DEBUG: API Key matched")
+        logger.debug("API Key matched")
         return {"type": "api_key", "user_id": None}
     
     # 2. Check for User (JWT)
-    logger.info("DEBUG: Checking for User JWT")
+    logger.debug("Checking for User JWT")
     try:
         # Verify JWT
         payload = jwt.decode(param, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
-            logger.info("DEBUG: JWT missing email")
+            logger.debug("JWT missing email")
             raise HTTPException(status_code=401, detail="Invalid token")
             
         # Fetch user
-        statement = select(User).where(User.email == email)
-        result = await session.execute(statement)
-        user = result.scalars().first()
+        user = await _resolve_principal(payload, session)
         
         if user:
-            logger.info(f"DEBUG: User authenticated: {user.email}")
+            logger.debug("User authenticated: %s", user.email)
             return {"type": "user", "user": user}
         else:
-             logger.info("DEBUG: User not found in DB")
+             logger.debug("User not found in DB")
     except jwt.PyJWTError as e:
-        logger.info(f"DEBUG: JWT Error: {e}")
+        logger.debug("JWT Error: %s", e)
     except Exception as e:
-        logger.error(f"DEBUG: Unexpected auth error: {e}")
+        logger.error("Unexpected auth error: %s", e)
 
-    logger.info("DEBUG: Authentication failed (neither API Key nor valid User Token)")
+    logger.debug("Authentication failed (neither API Key nor valid User Token)")
     raise HTTPException(status_code=401, detail="Not authenticated")
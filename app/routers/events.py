@@ -0,0 +1,51 @@
+import asyncio
+import json
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models import get_session
+from ..routers.core.auth.router import verify_api_key_or_user
+from ..config.config import settings
+from ..services import change_feed
+
+router = APIRouter(
+    prefix="/events",
+    tags=["events"],
+    responses={404: {"description": "Not found"}},
+)
+
+def _sse(event: dict) -> str:
+    return f"event: {event['entity']}\ndata: {json.dumps(event)}\n\n"
+
+@router.get("/stream")
+async def stream_events(
+    session: AsyncSession = Depends(get_session),
+    auth_info: dict = Depends(verify_api_key_or_user)
+):
+    # Server-sent events for agent, tool and phone number changes. API key
+    # clients (voice workers) see every change, users only their own.
+    user_id = auth_info["user"].id if auth_info["type"] == "user" else None
+
+    # Auth may have used a pooled connection; don't hold it for the whole stream
+    await session.close()
+
+    async def stream():
+        queue = change_feed.subscribe(user_id)
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=settings.CHANGE_FEED_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle stream
+                    yield ": ping\n\n"
+                    continue
+                yield _sse(event)
+        finally:
+            change_feed.unsubscribe(queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
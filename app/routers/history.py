@@ -1,13 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlmodel import select, SQLModel
+from sqlalchemy import func, insert, text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Optional
+from typing import List, Optional, Literal
 from datetime import date, time
+import base64
+import csv
+import io
+import json
 from ..models.table.history import History
+from ..models.table.history_transcript import HistoryTranscript
 from ..models.table.user import User
-from ..models import get_session
+from ..models import get_session, get_read_session, read_session_factory
 from ..routers.core.auth.router import get_current_user, verify_api_key_or_user
 from ..models.table.agent import Agent
+from ..config.config import settings
+from ..services import transcript_search, call_rollups
+from ..models.table.agent_daily_stats import AgentDailyStats
+from ..utils.fast_json import model_columns, rows_response
 
 router = APIRouter(
     prefix="/history",
@@ -22,41 +34,403 @@ class HistoryCreate(SQLModel):
     duration: int
     summary: Optional[str] = None
     conversation: List[dict] = []
+    idempotency_key: Optional[str] = None
 
-@router.post("/create", response_model=History)
+class HistoryRead(SQLModel):
+    id: int
+    user_id: int
+    agent_id: str
+    date: date
+    time: time
+    duration: int
+    summary: Optional[str] = None
+    conversation: List[dict] = []
+    idempotency_key: Optional[str] = None
+
+def _conversation():
+    # The transcript of a history row, empty if none was stored
+    return func.coalesce(HistoryTranscript.conversation, text("'[]'::jsonb"))
+
+def _with_conversation(statement):
+    # History rows joined with their transcript
+    return statement.add_columns(_conversation().label("conversation")).outerjoin(
+        HistoryTranscript, HistoryTranscript.history_id == History.id
+    )
+
+def _history_read(history: History, conversation: List[dict]) -> HistoryRead:
+    return HistoryRead(**history.model_dump(), conversation=conversation)
+
+class HistoryBulkCreate(SQLModel):
+    records: List[HistoryCreate]
+
+class HistoryBulkResult(SQLModel):
+    inserted: int
+    duplicates: int
+    ids: List[int]
+
+class HistoryItem(SQLModel):
+    id: int
+    agent_id: str
+    date: date
+    time: time
+    duration: int
+    summary: Optional[str] = None
+    # Only present in the "full" view
+    conversation: Optional[List[dict]] = None
+
+class HistoryPage(SQLModel):
+    items: List[HistoryItem]
+    next_cursor: Optional[str] = None
+
+class HistorySearchHit(SQLModel):
+    id: int
+    agent_id: str
+    date: date
+    time: time
+    duration: int
+    summary: Optional[str] = None
+    rank: float
+
+class DailyStats(SQLModel):
+    date: date
+    calls: int
+    total_duration: int
+    average_duration: float
+
+class AgentStats(SQLModel):
+    agent_id: str
+    calls: int
+    total_duration: int
+    average_duration: float
+    days: List[DailyStats]
+
+class TranscriptRead(SQLModel):
+    history_id: int
+    conversation: List[dict]
+
+def _encode_cursor(item) -> str:
+    raw = json.dumps([item.date.isoformat(), item.time.isoformat(), item.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        raw_date, raw_time, history_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return date.fromisoformat(raw_date), time.fromisoformat(raw_time), int(history_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.post("/create", response_model=HistoryRead)
 async def create_history(
     history_in: HistoryCreate, 
     session: AsyncSession = Depends(get_session), 
     auth_info: dict = Depends(verify_api_key_or_user)
 ):
-    if auth_info["type"] == "api_key":
-        # API Key access: We need to find the user_id from the agent
-        statement = select(Agent).where(Agent.id == history_in.agent_id)
-        result = await session.execute(statement)
-        agent = result.scalars().first()
-        
-        if not agent:
-             raise HTTPException(status_code=404, detail="Agent not found")
-        
-        user_id = agent.user_id
-    else:
-        # User access
-        user_id = auth_info["user"].id
-
-    history = History(
-        user_id=user_id,
-        **history_in.model_dump()
-    )
-    
-    session.add(history)
+    # The record belongs to the agent's owner. API Key access: any agent by ID.
+    # User access: only agents owned by the user
+    statement = select(Agent.user_id).where(Agent.id == history_in.agent_id)
+    if auth_info["type"] != "api_key":
+        statement = statement.where(Agent.user_id == auth_info["user"].id)
+    result = await session.execute(statement)
+    user_id = result.scalar()
+
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="Agent not found")
+
+    # A key already stored by an earlier attempt inserts nothing, also when two
+    # attempts race; the stored record is returned instead
+    statement = (
+        pg_insert(History)
+        .values(user_id=user_id, **history_in.model_dump(exclude={"conversation"}))
+        .on_conflict_do_nothing(index_elements=["user_id", "idempotency_key"])
+        .returning(History.id)
+    )
+    result = await session.execute(statement)
+    history_id = result.scalar()
+
+    if history_id is None:
+        existing_statement = _with_conversation(
+            select(History).where(History.user_id == user_id, History.idempotency_key == history_in.idempotency_key)
+        )
+        existing_result = await session.execute(existing_statement)
+        return _history_read(*existing_result.one())
+
+    await session.execute(
+        insert(HistoryTranscript).values(history_id=history_id, conversation=history_in.conversation)
+    )
+    await transcript_search.index_transcripts(session, [history_id])
+    await call_rollups.record_calls(session, [(history_in.agent_id, user_id, history_in.date, history_in.duration)])
     await session.commit()
-    await session.refresh(history)
-    return history
+    return HistoryRead(id=history_id, user_id=user_id, **history_in.model_dump())
 
-@router.get("/get/{agent_id}", response_model=List[History])
-async def read_history(agent_id: str, session: AsyncSession = Depends(get_session), current_user: User = Depends(get_current_user)):
-    statement = select(History).where(History.user_id == current_user.id, History.agent_id == agent_id).order_by(History.date.desc(), History.time.desc())
+@router.post("/bulk", response_model=HistoryBulkResult)
+async def create_history_bulk(
+    bulk_in: HistoryBulkCreate,
+    session: AsyncSession = Depends(get_session),
+    auth_info: dict = Depends(verify_api_key_or_user)
+):
+    records = bulk_in.records
+    if len(records) > settings.HISTORY_BULK_MAX_RECORDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.HISTORY_BULK_MAX_RECORDS} records per request",
+        )
+    if not records:
+        return HistoryBulkResult(inserted=0, duplicates=0, ids=[])
 
+    # Resolve agent -> user for every record in one query
+    agent_ids = {record.agent_id for record in records}
+    statement = select(Agent.id, Agent.user_id).where(Agent.id.in_(agent_ids))
+    if auth_info["type"] != "api_key":
+        statement = statement.where(Agent.user_id == auth_info["user"].id)
     result = await session.execute(statement)
-    histories = result.scalars().all()
-    return histories
+    user_ids = dict(result.all())
+
+    missing = agent_ids - user_ids.keys()
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Agent not found: {', '.join(sorted(missing))}")
+
+    rows = []
+    seen_keys = set()
+    for record in records:
+        user_id = user_ids[record.agent_id]
+        if record.idempotency_key is not None:
+            key = (user_id, record.idempotency_key)
+            if key in seen_keys:
+                continue
+            seen_keys.add(key)
+        rows.append({"user_id": user_id, **record.model_dump()})
+
+    # Reserve ids up front so transcripts can be matched to the rows that get inserted
+    id_result = await session.execute(
+        text("""SELECT nextval(pg_get_serial_sequence('"voice-agent-history"', 'id')) FROM generate_series(1, :n)"""),
+        {"n": len(rows)},
+    )
+    conversations = {}
+    for row, history_id in zip(rows, id_result.scalars().all()):
+        row["id"] = history_id
+        conversations[history_id] = row.pop("conversation")
+
+    # One multi-row INSERT; keys already stored by an earlier attempt are skipped
+    statement = (
+        pg_insert(History)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=["user_id", "idempotency_key"])
+        .returning(History.id)
+    )
+    result = await session.execute(statement)
+    ids = result.scalars().all()
+
+    if ids:
+        await session.execute(
+            insert(HistoryTranscript).values(
+                [{"history_id": history_id, "conversation": conversations[history_id]} for history_id in ids]
+            )
+        )
+        await transcript_search.index_transcripts(session, ids)
+        inserted = set(ids)
+        await call_rollups.record_calls(
+            session,
+            [(row["agent_id"], row["user_id"], row["date"], row["duration"]) for row in rows if row["id"] in inserted],
+        )
+    await session.commit()
+
+    return HistoryBulkResult(inserted=len(ids), duplicates=len(records) - len(ids), ids=ids)
+
+@router.get("/get/{agent_id}", response_model=List[HistoryRead])
+async def read_history(agent_id: str, session: AsyncSession = Depends(get_read_session), current_user: User = Depends(get_current_user)):
+    statement = (
+        select(*model_columns(HistoryRead, History, conversation=_conversation()))
+        .outerjoin(HistoryTranscript, HistoryTranscript.history_id == History.id)
+        .where(History.user_id == current_user.id, History.agent_id == agent_id)
+        .order_by(History.date.desc(), History.time.desc())
+    )
+
+    result = await session.execute(statement)
+    return rows_response(result.mappings().all())
+
+@router.get("/stats/{agent_id}", response_model=AgentStats)
+async def read_agent_stats(
+    agent_id: str,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    session: AsyncSession = Depends(get_read_session),
+    current_user: User = Depends(get_current_user)
+):
+    # Reads only the daily rollups: O(days), independent of the number of calls
+    statement = select(AgentDailyStats).where(
+        AgentDailyStats.user_id == current_user.id,
+        AgentDailyStats.agent_id == agent_id,
+    )
+    if start_date:
+        statement = statement.where(AgentDailyStats.day >= start_date)
+    if end_date:
+        statement = statement.where(AgentDailyStats.day <= end_date)
+    statement = statement.order_by(AgentDailyStats.day)
+
+    result = await session.execute(statement)
+    rollups = result.scalars().all()
+
+    days = [
+        DailyStats(
+            date=rollup.day,
+            calls=rollup.call_count,
+            total_duration=rollup.total_duration,
+            average_duration=rollup.total_duration / rollup.call_count if rollup.call_count else 0.0,
+        )
+        for rollup in rollups
+    ]
+    calls = sum(day.calls for day in days)
+    total_duration = sum(day.total_duration for day in days)
+    return AgentStats(
+        agent_id=agent_id,
+        calls=calls,
+        total_duration=total_duration,
+        average_duration=total_duration / calls if calls else 0.0,
+        days=days,
+    )
+
+@router.get("/transcript/{history_id}", response_model=TranscriptRead)
+async def get_transcript(
+    history_id: int,
+    session: AsyncSession = Depends(get_read_session),
+    auth_info: dict = Depends(verify_api_key_or_user)
+):
+    statement = (
+        select(HistoryTranscript.history_id, HistoryTranscript.conversation)
+        .join(History, HistoryTranscript.history_id == History.id)
+        .where(HistoryTranscript.history_id == history_id)
+    )
+    if auth_info["type"] != "api_key":
+        statement = statement.where(History.user_id == auth_info["user"].id)
+
+    result = await session.execute(statement)
+    transcript = result.first()
+
+    if not transcript:
+        raise HTTPException(status_code=404, detail="Transcript not found")
+    return TranscriptRead.model_validate(dict(transcript._mapping))
+
+@router.get("/search", response_model=List[HistorySearchHit])
+async def search_history(
+    q: str = Query(min_length=1),
+    agent_id: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    limit: int = Query(default=20, ge=1, le=100),
+    session: AsyncSession = Depends(get_read_session),
+    current_user: User = Depends(get_current_user)
+):
+    query = transcript_search.search_query(q)
+    rank = func.ts_rank_cd(HistoryTranscript.search_vector, query).label("rank")
+
+    # Matches come from the GIN index on search_vector; only small History columns are read
+    statement = (
+        select(History.id, History.agent_id, History.date, History.time, History.duration, History.summary, rank)
+        .join(HistoryTranscript, HistoryTranscript.history_id == History.id)
+        .where(History.user_id == current_user.id, HistoryTranscript.search_vector.op("@@")(query))
+    )
+    if agent_id:
+        statement = statement.where(History.agent_id == agent_id)
+    if start_date:
+        statement = statement.where(History.date >= start_date)
+    if end_date:
+        statement = statement.where(History.date <= end_date)
+    statement = statement.order_by(rank.desc(), History.date.desc(), History.time.desc()).limit(limit)
+
+    result = await session.execute(statement)
+    return [HistorySearchHit.model_validate(dict(row._mapping)) for row in result.all()]
+
+@router.get("/list/{agent_id}", response_model=HistoryPage, response_model_exclude_unset=True)
+async def list_history(
+    agent_id: str,
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    view: Literal["summary", "full"] = "summary",
+    session: AsyncSession = Depends(get_read_session),
+    current_user: User = Depends(get_current_user)
+):
+    # Keyset pagination on (date, time, id), newest first. The summary view never
+    # touches the transcript table.
+    columns = [History.id, History.agent_id, History.date, History.time, History.duration, History.summary]
+    statement = select(*columns).where(History.user_id == current_user.id, History.agent_id == agent_id)
+    if view == "full":
+        statement = _with_conversation(statement)
+    if cursor:
+        statement = statement.where(
+            tuple_(History.date, History.time, History.id) < tuple_(*_decode_cursor(cursor))
+        )
+    statement = statement.order_by(History.date.desc(), History.time.desc(), History.id.desc()).limit(limit + 1)
+
+    result = await session.execute(statement)
+    rows = result.all()
+
+    items = [HistoryItem.model_validate(dict(row._mapping)) for row in rows[:limit]]
+    next_cursor = _encode_cursor(items[-1]) if len(rows) > limit else None
+    return HistoryPage(items=items, next_cursor=next_cursor)
+
+EXPORT_COLUMNS = ["id", "agent_id", "date", "time", "duration", "summary"]
+
+@router.get("/export")
+async def export_history(
+    request: Request,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    agent_id: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    include_conversation: bool = False,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    # Auth may have used a pooled connection; don't hold it for the whole stream
+    await session.close()
+
+    columns = [getattr(History, name) for name in EXPORT_COLUMNS]
+
+    # Spans all of the user's agents unless one is given
+    statement = select(*columns).where(History.user_id == current_user.id)
+    if include_conversation:
+        statement = _with_conversation(statement)
+    if agent_id:
+        statement = statement.where(History.agent_id == agent_id)
+    if start_date:
+        statement = statement.where(History.date >= start_date)
+    if end_date:
+        statement = statement.where(History.date <= end_date)
+    statement = statement.order_by(History.date, History.time, History.id)
+
+    fieldnames = EXPORT_COLUMNS + (["conversation"] if include_conversation else [])
+    batch_size = settings.HISTORY_EXPORT_BATCH_SIZE
+    # Chosen now, while the request is live, like get_read_session does
+    session_factory = read_session_factory(request)
+
+    async def stream_rows():
+        # Own session: the request-scoped one is closed before streaming starts.
+        # session.stream() reads through a server-side cursor, so memory stays flat.
+        async with session_factory() as session:
+            result = await session.stream(statement.execution_options(yield_per=batch_size))
+
+            if format == "csv":
+                buffer = io.StringIO()
+                writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+                writer.writeheader()
+                yield buffer.getvalue()
+
+            async for rows in result.mappings().partitions(batch_size):
+                if format == "csv":
+                    buffer = io.StringIO()
+                    writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+                    for row in rows:
+                        row = dict(row)
+                        if include_conversation:
+                            row["conversation"] = json.dumps(row["conversation"])
+                        writer.writerow(row)
+                    yield buffer.getvalue()
+                else:
+                    yield "".join(json.dumps(dict(row), default=str) + "\n" for row in rows)
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_rows(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="history.{format}"'},
+    )
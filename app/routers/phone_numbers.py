@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Header, Security
+from fastapi import APIRouter, Depends, HTTPException, Header, Security, Request, Response
 from sqlmodel import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
@@ -7,8 +7,10 @@ from pydantic import BaseModel
 
 from ..models.table.phone_number import PhoneNumber
 from ..models.table.user import User
-from ..models import get_session
+from ..models import get_session, get_read_session
 from ..routers.core.auth.router import get_current_user, verify_api_key_or_user
+from ..utils.etag import make_etag, is_not_modified, not_modified
+from ..services import inbound_routing, change_feed
 
 router = APIRouter(
     prefix="/phone_numbers",
@@ -35,13 +37,14 @@ async def create_phone_number(
     )
     
     session.add(phone_number)
+    await change_feed.publish(session, "phone_number", "created", phone_number.id, current_user.id)
     await session.commit()
     await session.refresh(phone_number)
     return phone_number
 
 @router.get("/get", response_model=List[PhoneNumber])
 async def read_phone_numbers(
-    session: AsyncSession = Depends(get_session), 
+    session: AsyncSession = Depends(get_read_session), 
     current_user: User = Depends(get_current_user)
 ):
     statement = select(PhoneNumber).where(PhoneNumber.user_id == current_user.id)
@@ -52,7 +55,9 @@ async def read_phone_numbers(
 @router.get("/get/{id}", response_model=PhoneNumber)
 async def get_phone_number(
     id: UUID, 
-    session: AsyncSession = Depends(get_session), 
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_read_session), 
     auth_info: dict = Depends(verify_api_key_or_user)
 ):
     if auth_info["type"] == "api_key":
@@ -71,6 +76,11 @@ async def get_phone_number(
     
     if not phone_number:
         raise HTTPException(status_code=404, detail="Phone number not found")
+
+    etag = make_etag("phone_number", phone_number.id, phone_number.version)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     return phone_number
 
 @router.delete("/delete/{phone_id}")
@@ -89,7 +99,10 @@ async def delete_phone_number(
     if not phone_number:
         raise HTTPException(status_code=404, detail="Phone number not found")
         
+    number = phone_number.number
     await session.delete(phone_number)
+    await change_feed.publish(session, "phone_number", "deleted", phone_id, current_user.id, numbers=[number])
     await session.commit()
+    inbound_routing.invalidate(number)
     
     return {"ok": True}
@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlmodel import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from ..models.table.tool import Tool
 from ..models.table.user import User
-from ..models import get_session
+from ..models import get_session, get_read_session
 from ..routers.core.auth.router import get_current_user, verify_api_key_or_user
+from ..utils.etag import make_etag, is_not_modified, not_modified
+from ..utils.fast_json import model_columns, rows_response
+from ..services import change_feed
 from pydantic import BaseModel
 
 router = APIRouter(
@@ -41,15 +44,17 @@ async def create_tool(tool_in: ToolCreate, session: AsyncSession = Depends(get_s
     return tool
 
 @router.get("/list", response_model=List[Tool])
-async def list_tools(session: AsyncSession = Depends(get_session), current_user: User = Depends(get_current_user)):
-    statement = select(Tool).where(Tool.user_id == current_user.id)
+async def list_tools(session: AsyncSession = Depends(get_read_session), current_user: User = Depends(get_current_user)):
+    statement = select(*model_columns(Tool, Tool)).where(Tool.user_id == current_user.id)
     result = await session.execute(statement)
-    return result.scalars().all()
+    return rows_response(result.mappings().all())
 
 @router.get("/get/{id}", response_model=Tool)
 async def get_tool(
     id: str, 
-    session: AsyncSession = Depends(get_session), 
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_read_session), 
     auth_info: dict = Depends(verify_api_key_or_user)
 ):
     if auth_info["type"] == "api_key":
@@ -68,6 +73,11 @@ async def get_tool(
     
     if not tool:
         raise HTTPException(status_code=404, detail="Tool not found")
+
+    etag = make_etag("tool", tool.id, tool.version)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     return tool
 
 @router.patch("/update/{id}", response_model=Tool)
@@ -81,8 +91,10 @@ async def update_tool(id: str, tool_in: ToolUpdate, session: AsyncSession = Depe
     update_data = tool_in.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(tool, key, value)
+    tool.version = Tool.version + 1
     
     session.add(tool)
+    await change_feed.publish(session, "tool", "updated", tool.id, tool.user_id)
     await session.commit()
     await session.refresh(tool)
     return tool
@@ -0,0 +1,48 @@
+from typing import Dict, Optional
+from sqlmodel import select
+from app.config.config import settings
+from app.models import async_session
+from app.models.table.agent import Agent
+from app.utils.cache import TTLCache
+
+# Agent configs are read by every voice worker at call start but change rarely,
+# so keep recently used rows in-process instead of hitting Postgres each time.
+_cache = TTLCache(
+    max_size=settings.AGENT_CACHE_MAX_SIZE,
+    ttl_seconds=settings.AGENT_CACHE_TTL_SECONDS,
+)
+
+async def get_agent(agent_id: str) -> Optional[Agent]:
+    """
+    Returns the agent with the given id, served from the cache when possible.
+
+    Misses always load from the primary: a lagging replica could hand back the
+    row an update just invalidated, and it would then be cached for a full TTL.
+
+    Args:
+        agent_id: The id of the agent to fetch.
+    """
+    agent = _cache.get(agent_id)
+    if agent is not None:
+        return agent
+
+    statement = select(Agent).where(Agent.id == agent_id)
+    async with async_session() as session:
+        result = await session.execute(statement)
+        agent = result.scalars().first()
+
+    if agent is not None:
+        _cache.set(agent_id, agent)
+    return agent
+
+def invalidate(agent_id: str) -> None:
+    """Drops the cached copy of an agent after it has been written."""
+    _cache.invalidate(agent_id)
+
+def clear() -> None:
+    """Drops every cached agent, e.g. after change events may have been missed."""
+    _cache.clear()
+
+def stats() -> Dict[str, int]:
+    """Returns the cache size and its hit/miss/eviction counters."""
+    return _cache.stats()
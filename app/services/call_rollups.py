@@ -0,0 +1,43 @@
+from collections import defaultdict
+from typing import Iterable, Tuple
+from datetime import date
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.table.agent_daily_stats import AgentDailyStats
+
+async def record_calls(session: AsyncSession, calls: Iterable[Tuple[str, int, date, int]]) -> None:
+    """
+    Adds calls to the per-agent daily rollups in a single upsert.
+
+    Runs in the caller's transaction, so rollups and history commit together.
+
+    Args:
+        session: The session that inserted the history rows; the caller commits.
+        calls: (agent_id, user_id, date, duration) of every inserted call, where
+            user_id is the owner of the agent.
+    """
+    # Keyed like the rollup table; the owner is a property of the agent
+    totals = defaultdict(lambda: [0, 0])
+    owners = {}
+    for agent_id, user_id, day, duration in calls:
+        owners[agent_id] = user_id
+        entry = totals[(agent_id, day)]
+        entry[0] += 1
+        entry[1] += duration
+
+    if not totals:
+        return
+
+    rows = [
+        {"agent_id": agent_id, "user_id": owners[agent_id], "day": day, "call_count": count, "total_duration": duration}
+        for (agent_id, day), (count, duration) in totals.items()
+    ]
+    statement = pg_insert(AgentDailyStats).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[AgentDailyStats.agent_id, AgentDailyStats.day],
+        set_={
+            "call_count": AgentDailyStats.call_count + statement.excluded.call_count,
+            "total_duration": AgentDailyStats.total_duration + statement.excluded.total_duration,
+        },
+    )
+    await session.execute(statement)
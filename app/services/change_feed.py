@@ -0,0 +1,168 @@
+import asyncio
+import json
+import logging
+from typing import Dict, List, Optional
+import asyncpg
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config.config import settings
+from app.services import agent_cache, inbound_routing
+
+logger = logging.getLogger(__name__)
+
+# Agent, tool and phone number changes are published with pg_notify inside the
+# writing transaction, so Postgres delivers them only once the write commits.
+# Every API process LISTENs on one dedicated connection, drops its own cached
+# copies and fans the event out to its SSE subscribers (voice workers).
+_subscribers: Dict[asyncio.Queue, Optional[int]] = {}
+_listener_task: Optional[asyncio.Task] = None
+_listening: Optional[asyncio.Event] = None
+_resyncs = 0
+
+# Sent instead of the events a subscriber or this process may have missed;
+# receivers should refetch everything they hold.
+RESYNC = {"entity": "feed", "action": "resync"}
+
+async def publish(
+    session: AsyncSession,
+    entity: str,
+    action: str,
+    entity_id: str,
+    user_id: int,
+    numbers: Optional[List[str]] = None,
+) -> None:
+    """
+    Queues a change event in the session's transaction; call it before committing.
+
+    Args:
+        session: The session making the change.
+        entity: "agent", "tool" or "phone_number".
+        action: What happened, e.g. "created", "updated" or "deleted".
+        entity_id: The id of the changed row.
+        user_id: The owner of the row; user subscribers only see their own events.
+        numbers: Phone numbers whose inbound route changed.
+    """
+    event = {"entity": entity, "action": action, "id": str(entity_id), "user_id": user_id}
+    if numbers:
+        event["numbers"] = numbers
+    await session.execute(select(func.pg_notify(settings.CHANGE_FEED_CHANNEL, json.dumps(event))))
+
+def subscribe(user_id: Optional[int] = None) -> asyncio.Queue:
+    """
+    Registers a subscriber and returns the queue its events arrive on.
+
+    Args:
+        user_id: Only deliver events of this user's rows; None for all events.
+    """
+    queue = asyncio.Queue(maxsize=settings.CHANGE_FEED_QUEUE_SIZE)
+    _subscribers[queue] = user_id
+    return queue
+
+def unsubscribe(queue: asyncio.Queue) -> None:
+    _subscribers.pop(queue, None)
+
+def _deliver(queue: asyncio.Queue, event: dict) -> None:
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        # A subscriber that fell behind gets a resync instead of a backlog
+        global _resyncs
+        _resyncs += 1
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(RESYNC)
+
+def _dispatch(event: dict) -> None:
+    if event.get("entity") == "agent":
+        agent_cache.invalidate(event["id"])
+    for number in event.get("numbers", ()):
+        inbound_routing.invalidate(number)
+
+    for queue, user_id in list(_subscribers.items()):
+        if user_id is None or user_id == event.get("user_id"):
+            _deliver(queue, event)
+
+def _on_notify(connection, pid, channel, payload) -> None:
+    try:
+        event = json.loads(payload)
+    except ValueError:
+        logger.warning("Ignoring malformed change event: %r", payload)
+        return
+    _dispatch(event)
+
+def _resync() -> None:
+    # Events published while we were not listening are lost; start over
+    agent_cache.clear()
+    inbound_routing.clear()
+    for queue in list(_subscribers):
+        _deliver(queue, RESYNC)
+
+def _listen_dsn() -> str:
+    # asyncpg takes a plain postgresql:// DSN, not SQLAlchemy's driver URL
+    url = make_url(settings.DATABASE_URL).set(drivername="postgresql")
+    return url.render_as_string(hide_password=False)
+
+async def _listener_loop() -> None:
+    delay = settings.CHANGE_FEED_RECONNECT_SECONDS
+
+    while True:
+        connection = None
+        try:
+            connection = await asyncpg.connect(_listen_dsn())
+            await connection.add_listener(settings.CHANGE_FEED_CHANNEL, _on_notify)
+            logger.info("Listening for change events on %s", settings.CHANGE_FEED_CHANNEL)
+            # Anything cached before LISTEN was active, including on the first
+            # connect if startup gave up waiting, may have missed changes
+            _resync()
+            _listening.set()
+            delay = settings.CHANGE_FEED_RECONNECT_SECONDS
+
+            # Notifications arrive through the callback; the ping notices a dead connection
+            while True:
+                await asyncio.sleep(settings.CHANGE_FEED_HEARTBEAT_SECONDS)
+                await connection.execute("SELECT 1")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Change feed listener failed, reconnecting in %.0fs: %s", delay, e)
+        finally:
+            if connection is not None and not connection.is_closed():
+                await connection.close()
+
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, settings.CHANGE_FEED_MAX_RECONNECT_SECONDS)
+
+async def start_listener(timeout: float) -> None:
+    """
+    Starts listening for change events on the running event loop.
+
+    Waits until LISTEN is active, so caches filled afterwards can't miss a change.
+
+    Args:
+        timeout: Seconds to wait before returning anyway; the listener keeps
+            retrying in the background.
+    """
+    global _listener_task, _listening
+    if _listener_task is None:
+        _listening = asyncio.Event()
+        _listener_task = asyncio.create_task(_listener_loop())
+    try:
+        await asyncio.wait_for(_listening.wait(), timeout)
+    except asyncio.TimeoutError:
+        logger.warning("Change feed not listening after %.0fs; continuing startup", timeout)
+
+async def stop_listener() -> None:
+    """Stops the listener and closes its connection."""
+    global _listener_task
+    if _listener_task is not None:
+        _listener_task.cancel()
+        try:
+            await _listener_task
+        except asyncio.CancelledError:
+            pass
+        _listener_task = None
+
+def stats() -> Dict[str, int]:
+    """Returns the number of subscribers and how many fell behind and were resynced."""
+    return {"subscribers": len(_subscribers), "resyncs": _resyncs}
@@ -0,0 +1,65 @@
+from typing import Dict, Optional
+from sqlmodel import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config.config import settings
+from app.models.table.agent import Agent
+from app.models.table.phone_number import PhoneNumber
+from app.utils.cache import TTLCache
+
+# Dialed number -> agent id, consulted by SIP dispatch when a call arrives.
+# Numbers without an agent are cached too, so unknown callers stay cheap.
+_NO_AGENT = ""
+_routes = TTLCache(
+    max_size=settings.INBOUND_ROUTING_CACHE_MAX_SIZE,
+    ttl_seconds=settings.INBOUND_ROUTING_CACHE_TTL_SECONDS,
+)
+
+def _route_statement():
+    # Served by the indexes on phone_number.number and agent.inbound_id. When
+    # several rows share a number, the oldest agent wins.
+    return (
+        select(PhoneNumber.number, Agent.id)
+        .join(Agent, Agent.inbound_id == PhoneNumber.id)
+        .order_by(PhoneNumber.number, Agent.created_at, Agent.id)
+    )
+
+async def resolve(session: AsyncSession, number: str) -> Optional[str]:
+    """
+    Returns the id of the agent answering calls to a number, if any.
+
+    Args:
+        session: Session used on a cache miss. Use the primary, so a route
+            that was just changed is not cached stale from a lagging replica.
+        number: The dialed number in E.164 format.
+    """
+    agent_id = _routes.get(number)
+    if agent_id is not None:
+        return agent_id or None
+
+    result = await session.execute(_route_statement().where(PhoneNumber.number == number).limit(1))
+    row = result.first()
+    agent_id = row[1] if row else _NO_AGENT
+
+    _routes.set(number, agent_id)
+    return agent_id or None
+
+async def load(session: AsyncSession) -> int:
+    """Fills the map with every routed number; returns how many were loaded."""
+    result = await session.execute(_route_statement())
+    loaded = {}
+    for number, agent_id in result.all():
+        loaded.setdefault(number, agent_id)
+    for number, agent_id in loaded.items():
+        _routes.set(number, agent_id)
+    return len(loaded)
+
+def invalidate(number: str) -> None:
+    """Drops the cached route of a number after its assignment changed."""
+    _routes.invalidate(number)
+
+def clear() -> None:
+    _routes.clear()
+
+def stats() -> Dict[str, int]:
+    """Returns the map size and its hit/miss/eviction counters."""
+    return _routes.stats()
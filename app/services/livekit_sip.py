@@ -1,6 +1,9 @@
-import os
+import asyncio
 import logging
+from typing import Dict, Iterable, Optional, Set
+import aiohttp
 from livekit.api import LiveKitAPI
+from livekit.protocol.models import Pagination
 from livekit.protocol.sip import (
     CreateSIPInboundTrunkRequest, 
     SIPInboundTrunkInfo, 
@@ -8,91 +11,245 @@ from livekit.protocol.sip import (
     DeleteSIPTrunkRequest
 )
 
+from app.config.config import settings
+from app.utils.metrics import time_livekit_call
+
 logger = logging.getLogger(__name__)
 
-async def create_sip_inbound_trunk(name: str, number: str) -> None:
+# One client (and HTTP connection pool) shared by every SIP operation,
+# owned by the app lifespan.
+_api: Optional[LiveKitAPI] = None
+_http_session: Optional[aiohttp.ClientSession] = None
+
+# number -> sip_trunk_id (and the reverse) so unassigning a number doesn't have
+# to list and scan every trunk. Built from a full listing at startup; misses
+# look up just that number, and create/delete keep it up to date.
+_trunk_id_by_number: Dict[str, str] = {}
+_numbers_by_trunk_id: Dict[str, Set[str]] = {}
+_index_generation = 0
+_index_lock = asyncio.Lock()
+
+async def init_client(
+    url: Optional[str] = None,
+    api_key: Optional[str] = None,
+    api_secret: Optional[str] = None,
+) -> None:
+    """
+    Creates the shared LiveKit API client.
+
+    Args:
+        url: LiveKit server URL, defaults to settings.LIVEKIT_URL. Point this at a
+            local stand-in server in tests.
+        api_key: Defaults to settings.LIVEKIT_API_KEY.
+        api_secret: Defaults to settings.LIVEKIT_API_SECRET.
+    """
+    global _api, _http_session
+
+    if _api is not None:
+        return
+
+    api_url = url or settings.LIVEKIT_URL
+    api_key = api_key or settings.LIVEKIT_API_KEY
+    api_secret = api_secret or settings.LIVEKIT_API_SECRET
+
+    if not all([api_url, api_key, api_secret]):
+        logger.error("LiveKit credentials not set. SIP operations are disabled.")
+        return
+
+    timeout = aiohttp.ClientTimeout(
+        total=settings.LIVEKIT_HTTP_TIMEOUT_SECONDS,
+        connect=settings.LIVEKIT_HTTP_CONNECT_TIMEOUT_SECONDS,
+    )
+    connector = aiohttp.TCPConnector(
+        limit=settings.LIVEKIT_HTTP_POOL_SIZE,
+        keepalive_timeout=settings.LIVEKIT_HTTP_KEEPALIVE_SECONDS,
+    )
+    _http_session = aiohttp.ClientSession(timeout=timeout, connector=connector)
+    _api = LiveKitAPI(api_url, api_key, api_secret, session=_http_session)
+
+async def close_client() -> None:
+    """Closes the shared client and its connection pool."""
+    global _api, _http_session
+
+    if _api is not None:
+        await _api.aclose()
+        _api = None
+    if _http_session is not None:
+        await _http_session.close()
+        _http_session = None
+
+async def _get_api() -> Optional[LiveKitAPI]:
+    # Fall back to lazy creation when used outside the app lifespan (scripts, tests)
+    if _api is None:
+        await init_client()
+    return _api
+
+def _index_trunk(trunk_id: str, numbers: Iterable[str]) -> None:
+    numbers = set(numbers)
+    _numbers_by_trunk_id.setdefault(trunk_id, set()).update(numbers)
+    for number in numbers:
+        _trunk_id_by_number[number] = trunk_id
+
+def _unindex_trunk(trunk_id: str) -> None:
+    for number in _numbers_by_trunk_id.pop(trunk_id, ()):
+        if _trunk_id_by_number.get(number) == trunk_id:
+            del _trunk_id_by_number[number]
+
+async def load_trunk_index() -> None:
+    """
+    (Re)builds the number -> trunk index by paging through every inbound trunk.
+
+    The new index replaces the old one in a single step, so lookups never see a
+    half-built index. Callers that queue up behind a reload reuse its result.
+    """
+    global _trunk_id_by_number, _numbers_by_trunk_id, _index_generation
+
+    api = await _get_api()
+    if api is None:
+        return
+
+    generation = _index_generation
+    async with _index_lock:
+        if _index_generation != generation:
+            return
+
+        trunk_id_by_number: Dict[str, str] = {}
+        numbers_by_trunk_id: Dict[str, Set[str]] = {}
+
+        page_size = settings.LIVEKIT_SIP_LIST_PAGE_SIZE
+        after_id = ""
+        while True:
+            list_request = ListSIPInboundTrunkRequest(
+                page=Pagination(after_id=after_id, limit=page_size)
+            )
+            with time_livekit_call("list_inbound_trunks"):
+                trunks_list = await api.sip.list_sip_inbound_trunk(list_request)
+
+            new_trunks = [t for t in trunks_list.items if t.sip_trunk_id not in numbers_by_trunk_id]
+            for trunk in new_trunks:
+                numbers_by_trunk_id[trunk.sip_trunk_id] = set(trunk.numbers)
+                for number in trunk.numbers:
+                    trunk_id_by_number[number] = trunk.sip_trunk_id
+
+            # The server may cap the page size below ours, so only an empty page,
+            # or a cursor the server ignored, ends the listing
+            if not new_trunks:
+                break
+            after_id = new_trunks[-1].sip_trunk_id
+
+        _trunk_id_by_number = trunk_id_by_number
+        _numbers_by_trunk_id = numbers_by_trunk_id
+        _index_generation += 1
+        logger.info("Indexed %d numbers across %d SIP inbound trunks", len(trunk_id_by_number), len(numbers_by_trunk_id))
+
+async def _find_trunk_id(number: str) -> Optional[str]:
+    trunk_id = _trunk_id_by_number.get(number)
+    if trunk_id is not None:
+        return trunk_id
+
+    # Created outside this process, or before the index was loaded: look up
+    # just this number rather than listing every trunk
+    api = await _get_api()
+    if api is None:
+        return None
+    list_request = ListSIPInboundTrunkRequest(numbers=[number])
+    with time_livekit_call("list_inbound_trunks"):
+        trunks_list = await api.sip.list_sip_inbound_trunk(list_request)
+    for trunk in trunks_list.items:
+        _index_trunk(trunk.sip_trunk_id, trunk.numbers)
+    return _trunk_id_by_number.get(number)
+
+class SIPProvisioningError(Exception):
+    """Raised when a SIP trunk operation could not be completed."""
+
+async def create_sip_inbound_trunk(name: str, number: str, check_existing: bool = False) -> str:
     """
     Creates a SIP inbound trunk in LiveKit for the given number.
     
     Args:
         name: The name of the trunk (usually the agent's name).
         number: The phone number in E.164 format (e.g., +1234567890).
-    """
-    
-    api_url = os.getenv("LIVEKIT_URL")
-    api_key = os.getenv("LIVEKIT_API_KEY")
-    api_secret = os.getenv("LIVEKIT_API_SECRET")
+        check_existing: Return the number's existing trunk, if any, instead of
+            creating one. Set on retries; a lookup miss queries LiveKit for
+            just this number.
 
-    if not all([api_url, api_key, api_secret]):
-        logger.error("LiveKit credentials not set. Cannot create SIP trunk.")
-        return
+    Returns:
+        The id of the created trunk.
+
+    Raises:
+        SIPProvisioningError: If LiveKit is not configured or the request failed.
+    """
+    api = await _get_api()
+    if api is None:
+        raise SIPProvisioningError("LiveKit credentials not set. Cannot create SIP trunk.")
 
+    if check_existing:
+        # A retried job may find the trunk created by an attempt that timed out
+        # after LiveKit had already stored it; that counts as success.
+        try:
+            existing_trunk_id = await _find_trunk_id(number)
+        except Exception as e:
+            raise SIPProvisioningError(f"Failed to look up SIP inbound trunk for number {number}: {e}") from e
+        if existing_trunk_id:
+            logger.info("SIP inbound trunk %s already exists for number %s", existing_trunk_id, number)
+            return existing_trunk_id
+    
+    logger.info("Creating SIP inbound trunk for %s with number %s", name, number)
+    
+    trunk_info = SIPInboundTrunkInfo(
+        name=f"agent-{name}-trunk",
+        numbers=[number],
+        # You might want to restrict allowed_numbers or allowed_addresses here for security
+        # but for now we keep it open or rely on defaults.
+        # If using Twilio, you might not strictly need auth if you rely on IP allowlisting, 
+        # but LiveKit usually requires some configuration.
+        # For "Open" trunks (testing), you might need:
+        # allowed_addresses=["0.0.0.0/0"] # BE CAREFUL with this in prod!
+    )
+    
+    request = CreateSIPInboundTrunkRequest(trunk=trunk_info)
+    
     try:
-        async with LiveKitAPI(api_url, api_key, api_secret) as api:
-            # Check if trunk already exists? 
-            # The SDK doesn't have a simple "get by number", so we might just try to create it.
-            # If it fails because of duplicate number, we catch the error.
-            
-            logger.info(f"Creating SIP inbound trunk for {name} with number {number}")
-            
-            trunk_info = SIPInboundTrunkInfo(
-                name=f"agent-{name}-trunk",
-                numbers=[number],
-                # You might want to restrict allowed_numbers or allowed_addresses here for security
-                # but for now we keep it open or rely on defaults.
-                # If using Twilio, you might not strictly need auth if you rely on IP allowlisting, 
-                # but LiveKit usually requires some configuration.
-                # For "Open" trunks (testing), you might need:
-                # allowed_addresses=["0.0.0.0/0"] # BE CAREFUL with this in prod!
-            )
-            
-            request = CreateSIPInboundTrunkRequest(trunk=trunk_info)
-            
+        with time_livekit_call("create_inbound_trunk"):
             result = await api.sip.create_inbound_trunk(request)
-            logger.info(f"Successfully created SIP inbound trunk: {result.sip_trunk_id}")
-            
     except Exception as e:
-        logger.error(f"Failed to create SIP inbound trunk: {e}")
-        # We don't raise here to avoid blocking the agent update, 
-        # but in a real app you might want to notify the user.
+        raise SIPProvisioningError(f"Failed to create SIP inbound trunk for number {number}: {e}") from e
+
+    _index_trunk(result.sip_trunk_id, result.numbers)
+    logger.info("Successfully created SIP inbound trunk: %s", result.sip_trunk_id)
+    return result.sip_trunk_id
 
 async def delete_sip_inbound_trunk_by_number(number: str) -> None:
     """
     Deletes the SIP inbound trunk associated with the given number.
+
+    A number without a trunk is treated as already deleted.
     
     Args:
         number: The phone number to search for and delete the trunk of.
-    """
-    api_url = os.getenv("LIVEKIT_URL")
-    api_key = os.getenv("LIVEKIT_API_KEY")
-    api_secret = os.getenv("LIVEKIT_API_SECRET")
 
-    if not all([api_url, api_key, api_secret]):
-        logger.error("LiveKit credentials not set. Cannot delete SIP trunk.")
-        return
+    Raises:
+        SIPProvisioningError: If LiveKit is not configured or the request failed.
+    """
+    api = await _get_api()
+    if api is None:
+        raise SIPProvisioningError("LiveKit credentials not set. Cannot delete SIP trunk.")
 
     try:
-        async with LiveKitAPI(api_url, api_key, api_secret) as api:
-            # List all inbound trunks to find the one with the matching number
-            # Pagination might be needed if there are many trunks, but for now we list default page size
-            list_request = ListSIPInboundTrunkRequest()
-            trunks_list = await api.sip.list_sip_inbound_trunk(list_request)
-            
-            target_trunk_id = None
-            for trunk in trunks_list.items:
-                if number in trunk.numbers:
-                    target_trunk_id = trunk.sip_trunk_id
-                    break
-            
-            if target_trunk_id:
-                logger.info(f"Found trunk {target_trunk_id} for number {number}. Deleting...")
-                delete_request = DeleteSIPTrunkRequest(sip_trunk_id=target_trunk_id)
-                await api.sip.delete_sip_trunk(delete_request)
-                logger.info(f"Successfully deleted SIP inbound trunk: {target_trunk_id}")
-            else:
-                logger.warning(f"No SIP trunk found containing number: {number}")
+        target_trunk_id = await _find_trunk_id(number)
+        
+        if target_trunk_id:
+            logger.info("Found trunk %s for number %s. Deleting...", target_trunk_id, number)
+            delete_request = DeleteSIPTrunkRequest(sip_trunk_id=target_trunk_id)
+            try:
+                with time_livekit_call("delete_trunk"):
+                    await api.sip.delete_sip_trunk(delete_request)
+            finally:
+                # Either it is gone now or the entry was stale; a later miss resyncs
+                _unindex_trunk(target_trunk_id)
+            logger.info("Successfully deleted SIP inbound trunk: %s", target_trunk_id)
+        else:
+            logger.warning("No SIP trunk found containing number: %s", number)
 
     except Exception as e:
-        logger.error(f"Failed to delete SIP inbound trunk for number {number}: {e}")
-
-
+        raise SIPProvisioningError(f"Failed to delete SIP inbound trunk for number {number}: {e}") from e
@@ -0,0 +1,60 @@
+from typing import Dict, Optional
+from pydantic import BaseModel
+from sqlmodel import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config.config import settings
+from app.models.table.user import User
+from app.utils.cache import TTLCache
+
+class Principal(BaseModel):
+    """The authenticated user as seen by endpoints: just the claims they need."""
+    id: int
+    name: str
+    email: str
+
+# Short-lived cache of users whose token has already been checked against the
+# database, keyed by email (the token subject).
+_cache = TTLCache(
+    max_size=settings.AUTH_PRINCIPAL_CACHE_MAX_SIZE,
+    ttl_seconds=settings.AUTH_PRINCIPAL_CACHE_TTL_SECONDS,
+)
+
+def from_claims(payload: dict) -> Optional[Principal]:
+    """
+    Builds a principal straight from access token claims, without any lookup.
+
+    Returns None for tokens issued before the claims were embedded.
+    """
+    if "uid" not in payload or "name" not in payload:
+        return None
+    return Principal(id=payload["uid"], name=payload["name"], email=payload["sub"])
+
+async def get_principal(session: AsyncSession, email: str) -> Optional[Principal]:
+    """
+    Returns the principal for a token subject, loading it on a cache miss.
+
+    Args:
+        session: Session used to look the user up on a cache miss.
+        email: The `sub` claim of a verified token.
+    """
+    principal = _cache.get(email)
+    if principal is not None:
+        return principal
+
+    statement = select(User).where(User.email == email)
+    result = await session.execute(statement)
+    user = result.scalars().first()
+    if user is None:
+        return None
+
+    principal = Principal(id=user.id, name=user.name, email=user.email)
+    _cache.set(email, principal)
+    return principal
+
+def invalidate(email: str) -> None:
+    """Forgets a cached principal, e.g. when the user signs in or refreshes."""
+    _cache.invalidate(email)
+
+def stats() -> Dict[str, int]:
+    """Returns the cache size and its hit/miss/eviction counters."""
+    return _cache.stats()
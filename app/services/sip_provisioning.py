@@ -0,0 +1,183 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlmodel import select
+from sqlalchemy import and_, exists, or_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from app.config.config import settings
+from app.models import async_session
+from app.models.table.sip_provisioning_job import SipProvisioningJob
+from app.services import livekit_sip
+
+logger = logging.getLogger(__name__)
+
+# SIP trunk create/delete runs here, off the request path. Jobs live in the
+# database so they survive restarts and can be claimed by any API process.
+_wakeup = asyncio.Event()
+_worker_task: Optional[asyncio.Task] = None
+
+ACTIVE_STATUSES = ("pending", "running")
+
+def enqueue_create(session: AsyncSession, agent_id: str, trunk_name: str, number: str) -> SipProvisioningJob:
+    """
+    Adds a trunk creation job to the session; it runs once the caller commits.
+
+    Args:
+        session: The session of the request that triggered the change.
+        agent_id: The agent the number is being assigned to.
+        trunk_name: The name of the trunk (usually the agent's name).
+        number: The phone number in E.164 format.
+    """
+    job = SipProvisioningJob(agent_id=agent_id, action="create", trunk_name=trunk_name, number=number)
+    session.add(job)
+    return job
+
+def enqueue_delete(session: AsyncSession, agent_id: str, number: str) -> SipProvisioningJob:
+    """
+    Adds a trunk deletion job to the session; it runs once the caller commits.
+
+    Args:
+        session: The session of the request that triggered the change.
+        agent_id: The agent the number is being removed from.
+        number: The phone number whose trunk should be deleted.
+    """
+    job = SipProvisioningJob(agent_id=agent_id, action="delete", number=number)
+    session.add(job)
+    return job
+
+def notify() -> None:
+    """Wakes the worker up after new jobs have been committed."""
+    _wakeup.set()
+
+async def get_jobs(session: AsyncSession, agent_id: str, limit: int = 10) -> List[SipProvisioningJob]:
+    """Returns the most recent provisioning jobs of an agent, newest first."""
+    statement = (
+        select(SipProvisioningJob)
+        .where(SipProvisioningJob.agent_id == agent_id)
+        .order_by(SipProvisioningJob.id.desc())
+        .limit(limit)
+    )
+    result = await session.execute(statement)
+    return result.scalars().all()
+
+def _backoff(attempts: int) -> timedelta:
+    delay = settings.SIP_PROVISIONING_BACKOFF_SECONDS * (2 ** max(attempts - 1, 0))
+    return timedelta(seconds=min(delay, settings.SIP_PROVISIONING_MAX_BACKOFF_SECONDS))
+
+async def _claim_next_job() -> Optional[SipProvisioningJob]:
+    now = datetime.utcnow()
+    stale_before = now - timedelta(seconds=settings.SIP_PROVISIONING_JOB_TIMEOUT_SECONDS)
+    earlier = aliased(SipProvisioningJob)
+
+    claimable = or_(
+        and_(SipProvisioningJob.status == "pending", SipProvisioningJob.run_after <= now),
+        # Picked up by a process that died before finishing it
+        and_(SipProvisioningJob.status == "running", SipProvisioningJob.updated_at < stale_before),
+    )
+    # Jobs of one agent, and jobs for one number, run in order: e.g. delete the
+    # old trunk before creating the new one, also when a number moves to
+    # another agent
+    blocked = exists().where(
+        or_(earlier.agent_id == SipProvisioningJob.agent_id, earlier.number == SipProvisioningJob.number),
+        earlier.id < SipProvisioningJob.id,
+        earlier.status.in_(ACTIVE_STATUSES),
+    )
+    next_id = (
+        select(SipProvisioningJob.id)
+        .where(claimable, ~blocked)
+        .order_by(SipProvisioningJob.id)
+        .limit(1)
+        .with_for_update(skip_locked=True, of=SipProvisioningJob)
+        .scalar_subquery()
+    )
+    statement = (
+        update(SipProvisioningJob)
+        .where(SipProvisioningJob.id == next_id)
+        .values(status="running", attempts=SipProvisioningJob.attempts + 1, updated_at=now)
+        .returning(SipProvisioningJob)
+        .execution_options(synchronize_session=False)
+    )
+
+    async with async_session() as session:
+        result = await session.execute(statement)
+        job = result.scalars().first()
+        await session.commit()
+    return job
+
+async def _finish_job(job: SipProvisioningJob, error: Optional[Exception]) -> None:
+    now = datetime.utcnow()
+    if error is None:
+        values = {"status": "succeeded", "last_error": None, "updated_at": now}
+    elif job.attempts >= settings.SIP_PROVISIONING_MAX_ATTEMPTS:
+        values = {"status": "failed", "last_error": str(error), "updated_at": now}
+    else:
+        values = {
+            "status": "pending",
+            "last_error": str(error),
+            "run_after": now + _backoff(job.attempts),
+            "updated_at": now,
+        }
+
+    async with async_session() as session:
+        await session.execute(
+            update(SipProvisioningJob).where(SipProvisioningJob.id == job.id).values(**values)
+        )
+        await session.commit()
+
+async def _run_job(job: SipProvisioningJob) -> None:
+    if job.action == "create":
+        # Only a retry can find its own trunk from an earlier, timed out attempt
+        await livekit_sip.create_sip_inbound_trunk(job.trunk_name, job.number, check_existing=job.attempts > 1)
+    elif job.action == "delete":
+        await livekit_sip.delete_sip_inbound_trunk_by_number(job.number)
+    else:
+        raise livekit_sip.SIPProvisioningError(f"Unknown SIP provisioning action: {job.action}")
+
+async def _worker_loop() -> None:
+    while True:
+        _wakeup.clear()
+        try:
+            job = await _claim_next_job()
+        except Exception as e:
+            logger.error("Failed to claim SIP provisioning job: %s", e)
+            job = None
+
+        if job is None:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=settings.SIP_PROVISIONING_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        logger.info("Running SIP provisioning job %s (%s %s), attempt %d", job.id, job.action, job.number, job.attempts)
+        error = None
+        try:
+            await _run_job(job)
+        except Exception as e:
+            logger.error("SIP provisioning job %s failed: %s", job.id, e)
+            error = e
+
+        try:
+            await _finish_job(job, error)
+        except Exception as e:
+            # The job stays "running" and is reclaimed once it goes stale
+            logger.error("Failed to record result of SIP provisioning job %s: %s", job.id, e)
+
+def start_worker() -> None:
+    """Starts the background worker on the running event loop."""
+    global _worker_task
+    if _worker_task is None:
+        _worker_task = asyncio.create_task(_worker_loop())
+
+async def stop_worker() -> None:
+    """Stops the worker; an interrupted job is retried once it goes stale."""
+    global _worker_task
+    if _worker_task is not None:
+        _worker_task.cancel()
+        try:
+            await _worker_task
+        except asyncio.CancelledError:
+            pass
+        _worker_task = None
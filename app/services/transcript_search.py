@@ -0,0 +1,51 @@
+from typing import Iterable
+from sqlalchemy import cast, func, literal_column, update
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config.config import settings
+from app.models.table.history import History
+from app.models.table.history_transcript import HistoryTranscript
+
+def _language():
+    return cast(settings.HISTORY_SEARCH_LANGUAGE, REGCONFIG)
+
+def search_vector():
+    """
+    The indexed text of a call: its summary plus the message contents of the
+    transcript (not the roles, or "user" would match every call).
+
+    Must stay in sync with the backfill statement in app/models/schema.py.
+    """
+    summary_vector = func.to_tsvector(_language(), func.coalesce(History.summary, ""))
+    # The flag is SQL, not a bind: JSONB's bind processor would JSON-encode it
+    # into a string, which jsonb_to_tsvector rejects
+    contents = func.jsonb_path_query_array(HistoryTranscript.conversation, literal_column("'$[*].content'::jsonpath"))
+    transcript_vector = func.jsonb_to_tsvector(_language(), contents, literal_column("""'["string"]'::jsonb"""))
+    return summary_vector.op("||")(transcript_vector)
+
+def search_query(q: str):
+    """Parses user input with web-search syntax ("quoted phrases", or, -exclusions)."""
+    return func.websearch_to_tsquery(_language(), q)
+
+async def index_transcripts(session: AsyncSession, history_ids: Iterable[int]) -> None:
+    """
+    Computes the search vector of freshly inserted transcripts in one UPDATE.
+
+    Args:
+        session: The session that inserted the rows; the caller commits.
+        history_ids: Ids of the history rows whose transcripts were inserted.
+    """
+    history_ids = list(history_ids)
+    if not history_ids:
+        return
+
+    statement = (
+        update(HistoryTranscript)
+        .where(
+            HistoryTranscript.history_id.in_(history_ids),
+            HistoryTranscript.history_id == History.id,
+        )
+        .values(search_vector=search_vector())
+        .execution_options(synchronize_session=False)
+    )
+    await session.execute(statement)
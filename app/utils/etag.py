@@ -0,0 +1,23 @@
+import hashlib
+from fastapi import Request, Response
+
+def make_etag(*parts) -> str:
+    """
+    Strong ETag derived from identifying parts, e.g. ("agent", id, version).
+    """
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """Whether the client's If-None-Match already covers this ETag."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison, so ignore W/ prefixes
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return etag in candidates
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
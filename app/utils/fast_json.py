@@ -0,0 +1,42 @@
+import uuid
+from decimal import Decimal
+from typing import Any, Iterable, List, Mapping, Optional, Type
+import orjson
+from pydantic import BaseModel
+from starlette.responses import Response
+
+def _default(value: Any) -> Any:
+    # asyncpg returns its own UUID subclass, which orjson doesn't serialise
+    # natively; render it (and Decimal) the way Pydantic would
+    if isinstance(value, (uuid.UUID, Decimal)):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+class RowsJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+def model_columns(response_model: Type[BaseModel], table, **expressions) -> List:
+    """
+    Columns to select so each result row already has the shape of `response_model`.
+
+    Args:
+        response_model: The model documented as the endpoint's response.
+        table: The table model providing columns named like the response fields.
+        **expressions: SQL expressions for fields that are not columns of `table`.
+    """
+    return [
+        expressions[name].label(name) if name in expressions else getattr(table, name)
+        for name in response_model.model_fields
+    ]
+
+def rows_response(rows: Iterable[Mapping], headers: Optional[dict] = None) -> RowsJSONResponse:
+    """
+    Serialises result rows with orjson, skipping the response_model round trip.
+
+    The rows must come from `model_columns`, so the output matches the schema
+    FastAPI would have produced; keep `response_model` on the route for OpenAPI.
+    """
+    return RowsJSONResponse([dict(row) for row in rows], headers=headers)
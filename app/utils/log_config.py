@@ -0,0 +1,126 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from app.config.config import settings
+from app.utils.metrics import LOG_RECORDS_DROPPED
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+# Presentation-only extras, e.g. uvicorn's ANSI-coloured copy of the message
+_PRESENTATION_ATTRS = {"color_message"}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any `extra=` fields included."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and key not in _PRESENTATION_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of INFO/DEBUG records per logger; warnings and errors always pass.
+
+    Args:
+        rates: Logger name -> fraction of records to keep. A rate applies to the
+            logger's children too; the most specific name wins.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def _rate(self, name: str) -> float:
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that drops records instead of blocking when the queue is full.
+
+    Drops are counted in the log_records_dropped_total metric.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stock prepare formats the message on the calling (event loop) thread
+        # and drops exc_info. The queue never leaves the process, so pass the
+        # record through and let the listener thread do all the formatting.
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def configure_logging() -> None:
+    """
+    Routes all logging through a bounded queue to a writer thread.
+
+    The event loop only enqueues records; formatting to JSON and writing to
+    stderr happen on the listener thread. Levels and sampling come from
+    settings (LOG_LEVEL, LOG_LEVELS, LOG_SAMPLING, LOG_FORMAT).
+    """
+    global _listener
+
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    if settings.LOG_FORMAT == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(
+            "%(asctime)s | %(levelname)-8s | %(name)s | %(message)s",
+            datefmt="%H:%M:%S",
+        ))
+
+    log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(settings.LOG_SAMPLING))
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(settings.LOG_LEVEL)
+    for name, level in settings.LOG_LEVELS.items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging() -> None:
+    """Flushes queued records and stops the writer thread."""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
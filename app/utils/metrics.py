@@ -0,0 +1,234 @@
+import asyncio
+import glob
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, multiprocess
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_STATEMENT_DURATION = Histogram(
+    "db_statement_duration_seconds",
+    "Database statement execution time",
+    ["engine", "operation"],
+    buckets=LATENCY_BUCKETS,
+)
+LIVEKIT_SIP_DURATION = Histogram(
+    "livekit_sip_request_duration_seconds",
+    "LiveKit SIP API call duration",
+    ["operation", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped_total",
+    "Log records dropped because the logging queue was full",
+)
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request latency per route template.
+
+    Labels use the matched route's path (e.g. /agents/get/{agent_id}) so the
+    number of series stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the (shared) scope
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            HTTP_REQUEST_DURATION.labels(scope["method"], route_path, str(status)).observe(
+                time.perf_counter() - start
+            )
+
+def instrument_engine(engine: AsyncEngine, name: str) -> None:
+    """
+    Times every statement run by an engine, labelled by its leading SQL keyword.
+
+    Args:
+        engine: The engine to instrument.
+        name: Label distinguishing engines, e.g. "primary" or "replica".
+    """
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["query_start"].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+        DB_STATEMENT_DURATION.labels(name, operation).observe(time.perf_counter() - start)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        if context.connection is not None:
+            starts = context.connection.info.get("query_start")
+            if starts:
+                starts.pop()
+
+@contextmanager
+def time_livekit_call(operation: str):
+    """Records the duration and outcome of a LiveKit API call made inside the block."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        LIVEKIT_SIP_DURATION.labels(operation, outcome).observe(time.perf_counter() - start)
+
+class StatsCollector:
+    """
+    Exposes an in-process stats dict (pool or cache figures) on every scrape.
+
+    Args:
+        prefix: Metric name prefix, e.g. "db_pool".
+        stats: Returns {label value: {stat name: number}} when called.
+        label: Name of the label carrying the outer keys.
+        counters: Stat names that only ever increase; the rest are gauges.
+    """
+
+    def __init__(self, prefix: str, stats: Callable[[], Dict[str, Dict[str, float]]], label: str, counters: Iterable[str] = ()):
+        self.prefix = prefix
+        self.stats = stats
+        self.label = label
+        self.counters = set(counters)
+
+    def collect(self):
+        families = {}
+        for label_value, values in self.stats().items():
+            for key, value in values.items():
+                family = families.get(key)
+                if family is None:
+                    name = f"{self.prefix}_{key}"
+                    if key in self.counters:
+                        family = CounterMetricFamily(name, f"{self.prefix} {key}", labels=[self.label])
+                    else:
+                        family = GaugeMetricFamily(name, f"{self.prefix} {key}", labels=[self.label])
+                    families[key] = family
+                family.add_metric([label_value], value)
+        return families.values()
+
+def multiprocess_mode() -> bool:
+    """Whether several workers share metrics through PROMETHEUS_MULTIPROC_DIR."""
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+# Stats sources written to multiprocess gauges: (prefix, stats, label)
+_stats_sources: List[Tuple[str, Callable[[], Dict[str, Dict[str, float]]], str]] = []
+_stats_gauges: Dict[str, Gauge] = {}
+_publisher_task: Optional[asyncio.Task] = None
+
+def register_stats(prefix: str, stats: Callable[[], Dict[str, Dict[str, float]]], label: str, counters: Iterable[str] = ()) -> None:
+    """
+    Exports an in-process stats dict, see StatsCollector.
+
+    With several workers a scrape only reaches one of them, so the stats are
+    instead written to multiprocess gauges that /metrics sums over live workers
+    (maxima and saturation take the largest value). Counters become gauges
+    there, since they reset with their worker anyway.
+    """
+    if multiprocess_mode():
+        _stats_sources.append((prefix, stats, label))
+    else:
+        REGISTRY.register(StatsCollector(prefix, stats, label, counters))
+
+def _stats_gauge(name: str, label: str) -> Gauge:
+    gauge = _stats_gauges.get(name)
+    if gauge is None:
+        mode = "livemax" if name.endswith(("_max", "_saturation")) else "livesum"
+        gauge = Gauge(name, name.replace("_", " "), [label], multiprocess_mode=mode)
+        _stats_gauges[name] = gauge
+    return gauge
+
+def publish_stats() -> None:
+    """Writes this worker's registered stats to its multiprocess gauges."""
+    for prefix, stats, label in _stats_sources:
+        for label_value, values in stats().items():
+            for key, value in values.items():
+                _stats_gauge(f"{prefix}_{key}", label).labels(label_value).set(value)
+
+_PID_FILE = re.compile(r"_(\d+)\.db$")
+
+def reap_dead_workers() -> None:
+    """Removes the live gauges of workers that exited without cleaning up (e.g. crashed)."""
+    pids = set()
+    for path in glob.glob(os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], "gauge_live*.db")):
+        match = _PID_FILE.search(path)
+        if match:
+            pids.add(int(match.group(1)))
+    for pid in pids:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            multiprocess.mark_process_dead(pid)
+        except PermissionError:
+            pass
+
+async def _publisher_loop(interval: float) -> None:
+    while True:
+        try:
+            publish_stats()
+            reap_dead_workers()
+        except Exception as e:
+            logger.error("Failed to publish multiprocess stats: %s", e)
+        await asyncio.sleep(interval)
+
+def start_stats_publisher(interval: float) -> None:
+    """Starts writing stats periodically when running with several workers."""
+    global _publisher_task
+    if multiprocess_mode() and _publisher_task is None:
+        _publisher_task = asyncio.create_task(_publisher_loop(interval))
+
+async def stop_stats_publisher() -> None:
+    """Stops the publisher and drops this worker's live gauges."""
+    global _publisher_task
+    if _publisher_task is not None:
+        _publisher_task.cancel()
+        try:
+            await _publisher_task
+        except asyncio.CancelledError:
+            pass
+        _publisher_task = None
+    if multiprocess_mode():
+        multiprocess.mark_process_dead(os.getpid())
+
+def multiprocess_registry() -> CollectorRegistry:
+    """Registry aggregating the metrics every worker wrote, this one up to date."""
+    publish_stats()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
@@ -1,6 +1,9 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Optional, Tuple
 import jwt
+from passlib.context import CryptContext
 from app.config.config import settings
 
 # This should probably be in settings, but default for now
@@ -9,11 +12,56 @@ SECRET_KEY = settings.DATABASE_URL # using DB URL as valid string for now, user
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 30
 
-def verify_password(plain_password, hashed_password):
-    return plain_password == hashed_password
+# Passwords stored before hashing was introduced are plaintext: they still
+# verify, but are deprecated, so the next successful signin rehashes them. The
+# same happens to bcrypt hashes below the configured cost.
+pwd_context = CryptContext(
+    schemes=["bcrypt", "plaintext"],
+    deprecated=["plaintext"],
+    bcrypt__default_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+)
 
-def get_password_hash(password):
-    return password
+# bcrypt takes tens of milliseconds and releases the GIL, so it runs on a small
+# dedicated pool instead of the event loop (or the shared default executor).
+_hash_executor: Optional[ThreadPoolExecutor] = None
+
+async def _run_hashing(fn, *args):
+    global _hash_executor
+    if _hash_executor is None:
+        _hash_executor = ThreadPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            thread_name_prefix="password-hash",
+        )
+    return await asyncio.get_running_loop().run_in_executor(_hash_executor, fn, *args)
+
+async def verify_password(plain_password: str, hashed_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """
+    Checks a password against its stored hash.
+
+    Args:
+        plain_password: The password the user entered.
+        hashed_password: The stored hash, or None when the user does not exist;
+            a dummy hash is still checked so both cases take as long.
+
+    Returns:
+        Whether the password matches, and a new hash to store if the stored one
+        uses outdated parameters (None otherwise).
+    """
+    if hashed_password is None:
+        await _run_hashing(pwd_context.dummy_verify)
+        return False, None
+    return await _run_hashing(pwd_context.verify_and_update, plain_password, hashed_password)
+
+async def get_password_hash(password: str) -> str:
+    return await _run_hashing(pwd_context.hash, password)
+
+def shutdown_hashing() -> None:
+    """Stops the hashing threads once in-flight hashes are done."""
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=True)
+        _hash_executor = None
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -0,0 +1,80 @@
+"""
+Stand-in for the LiveKit server's SIP Twirp API, for benchmarks and local testing.
+
+Implements just the calls made by app/services/livekit_sip.py, keeping trunks in
+memory, with an optional artificial latency per request.
+"""
+import asyncio
+import itertools
+from typing import Dict, Optional
+from aiohttp import web
+from livekit.protocol.sip import (
+    CreateSIPInboundTrunkRequest,
+    DeleteSIPTrunkRequest,
+    ListSIPInboundTrunkRequest,
+    ListSIPInboundTrunkResponse,
+    SIPInboundTrunkInfo,
+    SIPTrunkInfo,
+)
+
+TWIRP_PREFIX = "/twirp/livekit.SIP/"
+
+class FakeLiveKit:
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.trunks: Dict[str, SIPInboundTrunkInfo] = {}
+        self.requests = 0
+        self._ids = itertools.count(1)
+        self._runner: Optional[web.AppRunner] = None
+
+    async def _pause(self):
+        self.requests += 1
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+    async def create_inbound_trunk(self, request: web.Request) -> web.Response:
+        await self._pause()
+        body = CreateSIPInboundTrunkRequest.FromString(await request.read())
+        trunk = SIPInboundTrunkInfo()
+        trunk.CopyFrom(body.trunk)
+        trunk.sip_trunk_id = f"ST_{next(self._ids):08d}"
+        self.trunks[trunk.sip_trunk_id] = trunk
+        return _protobuf(trunk)
+
+    async def list_inbound_trunks(self, request: web.Request) -> web.Response:
+        await self._pause()
+        body = ListSIPInboundTrunkRequest.FromString(await request.read())
+        trunks = sorted(self.trunks.values(), key=lambda t: t.sip_trunk_id)
+        if body.page.after_id:
+            trunks = [t for t in trunks if t.sip_trunk_id > body.page.after_id]
+        if body.page.limit:
+            trunks = trunks[: body.page.limit]
+        return _protobuf(ListSIPInboundTrunkResponse(items=trunks))
+
+    async def delete_trunk(self, request: web.Request) -> web.Response:
+        await self._pause()
+        body = DeleteSIPTrunkRequest.FromString(await request.read())
+        if self.trunks.pop(body.sip_trunk_id, None) is None:
+            return web.json_response({"code": "not_found", "msg": "trunk not found"}, status=404)
+        return _protobuf(SIPTrunkInfo(sip_trunk_id=body.sip_trunk_id))
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(TWIRP_PREFIX + "CreateSIPInboundTrunk", self.create_inbound_trunk)
+        app.router.add_post(TWIRP_PREFIX + "ListSIPInboundTrunk", self.list_inbound_trunks)
+        app.router.add_post(TWIRP_PREFIX + "DeleteSIPTrunk", self.delete_trunk)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 7881) -> str:
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        return f"http://{host}:{port}"
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+def _protobuf(message) -> web.Response:
+    return web.Response(body=message.SerializeToString(), content_type="application/protobuf")